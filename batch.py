@@ -0,0 +1,90 @@
+import json
+import time
+import hashlib
+import importlib
+import multiprocessing
+
+import core
+
+# Per-process state, set up once by init_worker.
+worker = None
+initial_dmem = None
+
+def init_worker(config_name):
+	'''
+	Pool initializer: loads the shared library and the ROM once per worker process.
+	'''
+	global worker, initial_dmem
+	worker = core.Core(importlib.import_module(config_name))
+	worker.journal.depth = 0
+	initial_dmem = bytes(worker.dmem)
+
+def parse_key(config, key):
+	'''
+	Accepts a keysym from config.keymap (e.g. "7", "plus", "return") or a [KI, KO] pair.
+	'''
+	if isinstance(key, str):
+		for k, v in config.keymap.items():
+			if k is not None and key.lower() in v[1:]: return k
+		raise ValueError(f'unknown key {key!r}')
+	return tuple(key)
+
+def run_job(job):
+	'''
+	Runs one scenario from a clean reset. A scenario is a dict with these keys (all but
+	"name" are optional):
+	- "keys": keys to press in order, each held for "hold" instructions (default 20000)
+	  and then released for "release" instructions (default 20000)
+	- "instructions": instructions to run after the last key (default 100000)
+	- "until": stop at this CSR:PC instead, e.g. "0:2C4A"
+	'''
+	config = worker.config
+	worker.cold_reset(initial_dmem)
+	start = time.perf_counter()
+	error = None
+
+	try:
+		for key in job.get('keys', []):
+			worker.press_key(parse_key(config, key))
+			worker.run(job.get('hold', 20000))
+			worker.release_keys()
+			worker.run(job.get('release', 20000))
+		worker.run(job.get('instructions', 100000), core.parse_csr_pc(job['until']) if 'until' in job else None)
+	except Exception as e: error = f'{type(e).__name__}: {e}'
+
+	regs = worker.cpu.snapshot()
+	regs['GR'] = regs['GR'].hex()
+	return {
+		'name': job.get('name'),
+		'registers': regs,
+		'lcd_sha256': hashlib.sha256(b''.join(worker.lcd[i*0x10:i*0x10+0xc] for i in range(0x20))).hexdigest(),
+		'instructions': worker.instructions,
+		'ticks': worker.scheduler.now,
+		'wall_time': time.perf_counter() - start,
+		'error': error,
+	}
+
+def run_batch(config_name, scenario_file, processes = None, report_file = None):
+	'''
+	Entry point for main.py --batch. Runs every scenario in the JSON list `scenario_file`
+	across a pool of `processes` workers (default: one per CPU) and writes the results,
+	in scenario order, to `report_file` (default: stdout).
+	'''
+	with open(scenario_file) as f: jobs = json.load(f)
+	for i, job in enumerate(jobs): job.setdefault('name', str(i))
+
+	start = time.perf_counter()
+	with multiprocessing.Pool(processes, init_worker, (config_name,)) as pool: results = pool.map(run_job, jobs, chunksize = 1)
+	elapsed = time.perf_counter() - start
+
+	report = {
+		'processes': processes or multiprocessing.cpu_count(),
+		'wall_time': elapsed,
+		'instructions': sum(r['instructions'] for r in results),
+		'jobs': results,
+	}
+	text = json.dumps(report, indent = 4)
+	if report_file is None: print(text)
+	else:
+		with open(report_file, 'w') as f: f.write(text)
+		print(f'{len(results)} jobs, {report["instructions"]} instructions in {elapsed:.3f} s ({report["processes"]} processes), report written to {report_file}')
@@ -0,0 +1,144 @@
+import os
+import sys
+import json
+import time
+import types
+import random
+import ctypes
+import platform
+import tempfile
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+import pygame
+
+import core
+import render
+
+# Base address of the benchmark loop in segment 0.
+LOOP_ADDR = 0x0200
+
+def synthetic_rom():
+	'''
+	Builds a 128 KB ROM image that runs a tight loop of register, immediate and data memory
+	instructions from reset, so no copyrighted ROM is needed.
+	'''
+	rom = bytearray(0x20000)
+	rom[0:4] = (0x8e00).to_bytes(2, 'little') + LOOP_ADDR.to_bytes(2, 'little')    # SP, reset vector
+
+	words = []
+	for i in range(8):
+		words.append(0x0000 | i << 8 | i)           # MOV Ri, #i
+		words.append(0x1000 | i << 8 | 1)           # ADD Ri, #1
+		words += [0x9011 | i << 8, 0x9000 + i*2]    # ST Ri, 9000H + 2i
+	words.append(0xfe8f)                            # NOP
+	disp = -(len(words) + 1)
+	words.append(0xce00 | disp & 0xff)              # BAL loop start
+
+	for i, word in enumerate(words): rom[LOOP_ADDR + i*2:LOOP_ADDR + i*2 + 2] = word.to_bytes(2, 'little')
+	return bytes(rom)
+
+def measure(func, number, repeat = 5):
+	'''
+	Returns the best mean time per call in seconds over `repeat` runs of `number` calls.
+	'''
+	best = float('inf')
+	for _ in range(repeat):
+		start = time.perf_counter()
+		for _ in range(number): func()
+		best = min(best, (time.perf_counter() - start) / number)
+	return best
+
+def lcd_patterns():
+	rng = random.Random(0)
+	return {
+		'blank': bytes(31 * 12),
+		'checker': bytes(0xaa if y % 2 == 0 else 0x55 for y in range(31) for _ in range(12)),
+		'random': bytes(rng.getrandbits(8) for _ in range(31 * 12)),
+		'full': bytes([0xff] * (31 * 12)),
+	}
+
+def bench_execution(sim, initial_dmem, results):
+	for mode, count in (('burst', 1000000), ('precise', 100000)):
+		sim.cold_reset(initial_dmem)
+		sim.core_reset(False)
+		sim.precise_mode = mode == 'precise'
+		start = time.perf_counter()
+		executed = sim.run(count)
+		results[f'ips_{mode}'] = executed / (time.perf_counter() - start)
+	sim.precise_mode = False
+
+def bench_memory(sim, results):
+	size = 0x1000
+	read_byte = sim.sim.memoryGetData
+	results['dmem_bulk_us'] = measure(lambda: sim.read_dmem_bytes(0x9000, size), 1000) * 1e6
+	results['dmem_chunked_ffi_us'] = measure(lambda: core.read_mem_bytes(sim.sim, 0x9000, size), 10) * 1e6
+	results['dmem_per_byte_ffi_us'] = measure(lambda: [read_byte(ctypes.c_uint8(0), ctypes.c_uint16(addr), ctypes.c_size_t(1)) for addr in range(0x9000, 0x9000 + size)], 5) * 1e6
+
+def bench_lcd(results):
+	dest = pygame.Surface((96*3, 32*3))
+	for name, vram in lcd_patterns().items():
+		rows = tuple(vram[i*12:i*12 + 12] for i in range(31))
+		results[f'lcd_surface_{name}_us'] = measure(lambda: dest.blit(render.lcd_surface(rows), (0, 0)), 200) * 1e6
+		results[f'lcd_rects_{name}_us'] = measure(lambda: render.draw_lcd_rects(dest, rows, 0, 0), 20) * 1e6
+	sbar = lcd_patterns()['random'][:12]
+	segments = render.status_bar_segments(pygame.Surface((300, 12)), (pygame.Rect(i * 16, 0, 16, 10) for i in range(18)), 0, 0)
+	results['status_bar_us'] = measure(lambda: dest.blits([segment for segment, on in zip(segments, render.get_scr_data(sbar)) if on], False), 10000) * 1e6
+
+	# Overlay text: a font lookup and render every time, and through the text cache
+	pygame.font.init()
+	text_cache = render.TextCache()
+	results['overlay_text_uncached_us'] = measure(lambda: dest.blit(pygame.font.SysFont(None, 22).render('Displaying LCD', True, (0, 0, 0)), (0, 0)), 20) * 1e6
+	results['overlay_text_cached_us'] = measure(lambda: dest.blit(text_cache.render('Displaying LCD', 22, (0, 0, 0)), (0, 0)), 10000) * 1e6
+
+def bench_formatting(sim, results):
+	dmem = bytes(sim.dmem)
+	rows = [(0x8000 + i, dmem[i:i + 16]) for i in range(0, len(dmem), 16)]
+	results['hex_dump_all_ms'] = measure(lambda: [render.format_hex_row(0, addr, data) for addr, data in rows], 5) * 1e3
+	results['hex_dump_visible_us'] = measure(lambda: [render.format_hex_row(0, addr, data) for addr, data in rows[:32]], 200) * 1e6
+
+	# Register display: every field formatted, and nothing changed since the last update
+	snap = sim.take_snapshot()
+	formats = dict(render.REG_FORMATS, Instruction = lambda value: sim.disassembler.instruction(*value))
+	results['regs_all_fields_us'] = measure(lambda: render.Fields(formats, render.format_byte).update(render.reg_values(snap)), 200) * 1e6
+	fields = render.Fields(formats, render.format_byte)
+	fields.update(render.reg_values(snap))
+	results['regs_unchanged_us'] = measure(lambda: fields.update(render.reg_values(snap)), 200) * 1e6
+
+def run(config, out_file = None):
+	'''
+	Entry point for main.py --bench. Runs every benchmark against a synthetic ROM, prints
+	a table and writes the results as JSON to `out_file`.
+	'''
+	fd, rom_file = tempfile.mkstemp(suffix = '.bin')
+	with os.fdopen(fd, 'wb') as f: f.write(synthetic_rom())
+
+	bench_config = types.SimpleNamespace(**{k: v for k, v in vars(config).items() if not k.startswith('__')})
+	bench_config.rom_file = rom_file
+	bench_config.stats_enabled = False
+	bench_config.disas_index = False
+
+	results = {}
+	try:
+		sim = core.Core(bench_config)
+		sim.journal.depth = 0
+		initial_dmem = bytes(sim.dmem)
+		bench_execution(sim, initial_dmem, results)
+		bench_memory(sim, results)
+		bench_lcd(results)
+		bench_formatting(sim, results)
+		sim.sim.memoryFree()
+	finally: os.remove(rom_file)
+
+	for name, value in results.items(): print(f'{name:<28}{value:>14.2f}')
+
+	report = {
+		'python': sys.version,
+		'platform': platform.platform(),
+		'pygame': pygame.version.ver,
+		'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+		'results': results,
+	}
+	if out_file is not None:
+		with open(out_file, 'w') as f: json.dump(report, f, indent = 4)
+		print(f'Results written to {out_file}')
+	return report
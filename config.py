@@ -9,6 +9,9 @@ rom_file = 'rom.bin'
 # Toggle real/emulator ROM mode.
 real_hardware = True
 
+# Path to the ROM info cache (ROM version and checksum, keyed by the ROM file's hash).
+rom_info_cache = 'rom_info.json'
+
 # Path to the status bar image.
 status_bar_path = 'images/interface_es_bar.png'
 
@@ -33,6 +36,13 @@ console_bg = '#0c0c0c'
 # "Console" text color.
 console_fg = '#cccccc'
 
+# "Console" color of registers that changed in the last register display update.
+console_changed_fg = '#f9f1a5'
+
+# Register display refresh rate in updates per second while running. In single-step mode
+# the display is updated after every step.
+regs_refresh_rate = 10
+
 # Pygame text color.
 pygame_color = (0, 0, 0)
 
@@ -40,6 +50,74 @@ pygame_color = (0, 0, 0)
 screen_tl_w = 58
 screen_tl_h = 132
 
+# LCD renderer.
+# 'surface' unpacks VRAM into an 8-bit surface and draws it with a single scaled blit.
+# 'rects' draws every lit pixel with pygame.draw.rect; it is slower and only kept for comparison.
+# The average LCD draw time is shown in the register display.
+lcd_renderer = 'surface'
+
+# Display refresh rate in frames per second.
+# While single-step mode is waiting for a step, the display is refreshed at `idle_refresh_rate`.
+refresh_rate = 60
+idle_refresh_rate = 10
+
+# Execution mode.
+# Precise mode steps one instruction at a time and services the peripherals after every
+# instruction. Burst mode runs up to `burst_size` instructions per loop iteration and only
+# handles peripheral events when they are due; the timer counter and the key interrupt
+# are refreshed every `periph_interval` instructions.
+# Precise mode can also be toggled at runtime (right-click > Precise execution).
+precise_mode = False
+burst_size = 1000
+periph_interval = 16
+
+# Emulation speed.
+# While running in the GUI, execution is throttled to the speed of real hardware: `cpu_clock`
+# cycles per second. SimU8 doesn't report cycle counts, so every instruction is counted as
+# `cycles_per_instruction` cycles. `speed` is a multiplier on top of that (0: unlimited) and
+# can be changed at runtime (right-click > Speed). Headless and batch runs are never throttled.
+cpu_clock = 1024000
+cycles_per_instruction = 2
+speed = 1
+
+# Timer ticks per second while the CPU is in STOP mode.
+# The emulation thread sleeps through STOP mode instead of counting these one by one.
+stop_tick_rate = 32768
+
+# Instruction trace (right-click > Record instruction trace, or --trace in headless mode).
+# The last `trace_depth` instructions are kept in memory and logged when an illegal or
+# unimplemented instruction is hit; when recording to a file, the buffer is written out
+# compressed each time it fills up. `trace_sp_ea` also records SP and EA (8 bytes per
+# instruction instead of 4). View a trace file with `python main.py --show-trace <file>`.
+trace_depth = 0x10000
+trace_sp_ea = False
+trace_path = 'trace.u8t'
+
+# Disassembly.
+# Decoded instructions are kept in an LRU cache of `disas_cache_size` entries. If
+# `disas_index` is on, every code segment the CPU runs in is also disassembled once in the
+# background, and instructions in it are looked up instead of decoded.
+disas_cache_size = 0x1000
+disas_index = True
+
+# Save states (right-click > Save state / Load state, or --load-state / --save-state).
+# Slot n is stored as `save_state_dir`/slot<n>.u8s.
+save_state_dir = 'states'
+save_slots = 4
+
+# Rewind (right-click > Step back / Rewind, or [).
+# Up to `rewind_depth` instructions executed in single-step or precise mode are recorded as
+# undo deltas (0 disables recording), with a full keyframe every `rewind_keyframe_interval`
+# instructions. Memory use and the last rewind time are shown in the register display.
+rewind_depth = 100000
+rewind_keyframe_interval = 1000
+
+# Statistics (right-click > Collect statistics / Show statistics, or I).
+# Times each phase of the emulation and GUI loops and counts FFI calls. If enabled when
+# quitting, the statistics are written to `stats_path`.
+stats_enabled = False
+stats_path = 'stats.json'
+
 # Hex display window size.
 data_mem_width = 700
 data_mem_height = 600
@@ -0,0 +1,1075 @@
+import os
+import json
+import math
+import time
+import zlib
+import heapq
+import ctypes
+import struct
+import hashlib
+import logging
+import collections
+
+import stats
+import disasm
+import tracer
+
+class Data_t(ctypes.Union):
+	_fields_ = [
+	('raw', ctypes.c_uint64),
+	('qword', ctypes.c_uint64),
+	('dword', ctypes.c_uint32),
+	('word', ctypes.c_uint16),
+	('byte', ctypes.c_uint8),
+	]
+
+class GR_t(ctypes.Union):
+	_fields_ = [
+		('qrs', ctypes.c_uint64 * 2),
+		('xrs', ctypes.c_uint32 * 4),
+		('ers', ctypes.c_uint16 * 8),
+		('rs', ctypes.c_uint8 * 16)
+	]
+
+class PSW_t_field(ctypes.Structure):
+	_fields_ = [
+		('ELevel', ctypes.c_uint8, 2),
+		('HC', ctypes.c_uint8, 1),
+		('MIE', ctypes.c_uint8, 1),
+		('OV', ctypes.c_uint8, 1),
+		('S', ctypes.c_uint8, 1),
+		('Z', ctypes.c_uint8, 1),
+		('C', ctypes.c_uint8, 1),
+	]
+
+class PSW_t(ctypes.Union):
+	_fields_ = [
+		('raw', ctypes.c_uint8),
+		('field', PSW_t_field),
+	]
+
+# Scalar registers exported by SimU8, in display order. GR is handled separately.
+REGISTERS = (
+	('CSR', ctypes.c_uint8), ('PC', ctypes.c_uint16), ('SP', ctypes.c_uint16), ('PSW', ctypes.c_uint8),
+	('DSR', ctypes.c_uint8), ('EA', ctypes.c_uint16), ('LCSR', ctypes.c_uint8), ('LR', ctypes.c_uint16),
+	('ECSR1', ctypes.c_uint8), ('ELR1', ctypes.c_uint16), ('EPSW1', ctypes.c_uint8),
+	('ECSR2', ctypes.c_uint8), ('ELR2', ctypes.c_uint16), ('EPSW2', ctypes.c_uint8),
+	('ECSR3', ctypes.c_uint8), ('ELR3', ctypes.c_uint16), ('EPSW3', ctypes.c_uint8),
+)
+
+# Save state file: STATE_MAGIC, STATE_HEADER (version, uncompressed size), then a zlib
+# stream of: frontend state as JSON (length-prefixed), GR, the REGISTERS in order and
+# data memory 00:8000H - 00:FFFFH.
+STATE_MAGIC = b'U8SS'
+STATE_VERSION = 1
+STATE_HEADER = struct.Struct('<BI')
+
+def load_library(config):
+	lib = ctypes.CDLL(os.path.abspath(config.shared_lib))
+	lib.memoryGetData.restype = ctypes.c_uint64
+	lib.memoryInit(ctypes.c_char_p(config.rom_file.encode()), None)
+	return lib
+
+def parse_csr_pc(text):
+	'''
+	Parses a CSR:PC address in hex (e.g. "0:2C4A") into (CSR << 16) + PC.
+	'''
+	csr, pc = (int(part, 16) for part in text.split(':'))
+	if not 0 <= csr <= 0xf or not 0 <= pc <= 0xffff: raise ValueError(f'address out of range: {text}')
+	return (csr << 16) + pc
+
+def read_mem_bytes(lib, addr, num_bytes, segment = 0):
+	'''
+	Reads memory through memoryGetData, 8 bytes per call where possible.
+	'''
+	odd = addr % 2 != 0
+	if odd:
+		addr -= 1
+		num_bytes += 1
+
+	data = bytearray()
+	bytes_grabbed = 0
+
+	while bytes_grabbed < num_bytes:
+		remaining = num_bytes - bytes_grabbed
+		if remaining >= 8: grab = 8
+		elif remaining >= 4: grab = 4
+		elif remaining >= 2: grab = 2
+		else: grab = 1
+
+		dt = lib.memoryGetData(ctypes.c_uint8(segment), ctypes.c_uint16(addr + bytes_grabbed), ctypes.c_size_t(grab))
+		data += dt.to_bytes(grab, 'little')
+		bytes_grabbed += grab
+
+	if odd: return bytes(data[1:])
+	else: return bytes(data)
+
+def rom_info(config):
+	'''
+	Returns the ROM version and checksum text shown by "ROM info", computed straight from
+	the ROM file. SimU8 maps data segment 1 to ROM offset 10000H and segment 8 to offset 0,
+	so the checksum (of 8:0000H - 8:FFFFH and 1:0000H - 1:FFFBH) is the sum of the first
+	1FFFCH bytes of the file. Results are cached in config.rom_info_cache, keyed by the
+	SHA-256 of the ROM file.
+	'''
+	with open(config.rom_file, 'rb') as f: rom = f.read()
+	rom_hash = hashlib.sha256(rom).hexdigest()
+	try:
+		with open(config.rom_info_cache) as f: cache = json.load(f)
+	except (OSError, ValueError): cache = {}
+	if rom_hash in cache: return cache[rom_hash]
+
+	rom = rom.ljust(0x20000, b'\0')
+	version = rom[0x1fff4:0x1fffa].decode()
+	rev = rom[0x1fffa:0x1fffc].decode()
+	csum1 = int.from_bytes(rom[0x1fffc:0x1fffe], 'little')
+	csum = -sum(rom[:0x1fffc]) % 0x10000
+	text = f'{version} Ver{rev}\nSUM {csum:04X} {"OK" if csum == csum1 else "NG"}'
+
+	cache[rom_hash] = text
+	try:
+		with open(config.rom_info_cache, 'w') as f: json.dump(cache, f, indent = 4)
+	except OSError as e: logging.warning(f'could not write ROM info cache: {e}')
+	return text
+
+class CpuState:
+	'''
+	Persistent ctypes views of SimU8's exported registers, bound once at startup so
+	that reading a register doesn't involve a symbol lookup.
+	'''
+	__slots__ = ('gr', 'csr', 'pc', 'sp', 'psw', 'dsr', 'ea', 'lcsr', 'lr', 'ecsr', 'elr', 'epsw', 'data_memory', 'scalars', 'raw_size')
+
+	def __init__(self, lib):
+		self.gr = GR_t.in_dll(lib, 'GR')
+		self.csr = ctypes.c_uint8.in_dll(lib, 'CSR')
+		self.pc = ctypes.c_uint16.in_dll(lib, 'PC')
+		self.sp = ctypes.c_uint16.in_dll(lib, 'SP')
+		self.psw = PSW_t.in_dll(lib, 'PSW')
+		self.dsr = ctypes.c_uint8.in_dll(lib, 'DSR')
+		self.ea = ctypes.c_uint16.in_dll(lib, 'EA')
+		self.lcsr = ctypes.c_uint8.in_dll(lib, 'LCSR')
+		self.lr = ctypes.c_uint16.in_dll(lib, 'LR')
+		self.ecsr = tuple(ctypes.c_uint8.in_dll(lib, f'ECSR{i}') for i in range(1, 4))
+		self.elr = tuple(ctypes.c_uint16.in_dll(lib, f'ELR{i}') for i in range(1, 4))
+		self.epsw = tuple(PSW_t.in_dll(lib, f'EPSW{i}') for i in range(1, 4))
+		self.data_memory = ctypes.c_void_p.in_dll(lib, 'DataMemory')
+		self.scalars = tuple((name, typ.in_dll(lib, name)) for name, typ in REGISTERS)
+		self.raw_size = ctypes.sizeof(self.gr) + sum(ctypes.sizeof(var) for _, var in self.scalars)
+
+	def snapshot(self):
+		'''
+		Copies the whole register set. Returns a dict of register name -> value, with GR
+		as its 16 raw bytes.
+		'''
+		regs = {name: var.value for name, var in self.scalars}
+		regs['GR'] = bytes(self.gr)
+		return regs
+
+	def save_raw(self):
+		'''
+		Returns GR and the REGISTERS, in order, as their raw bytes (`raw_size` bytes).
+		'''
+		return bytes(self.gr) + b''.join(bytes(var) for _, var in self.scalars)
+
+	def load_raw(self, data):
+		pos = 0
+		for var in (self.gr,) + tuple(var for _, var in self.scalars):
+			size = ctypes.sizeof(var)
+			ctypes.memmove(ctypes.addressof(var), bytes(data[pos:pos + size]), size)
+			pos += size
+
+# Machine state published by the emulation thread for the GUI thread.
+# `breakpoints` and `watchpoints` are copies, as (address, condition, enabled, hits) and
+# ((address, length), value, hits) tuples sorted by address.
+Snapshot = collections.namedtuple('Snapshot', 'seq regs code dmem prev_csr_pc stop_accept stop_mode ips single_step ticks breakpoints watchpoints')
+
+class EventScheduler:
+	'''
+	Peripheral events keyed on the emulated tick count. One tick is one instruction,
+	which is the time base the timer has always counted in.
+	'''
+	def __init__(self):
+		self.now = 0
+		self.queue = []
+		self.seq = 0
+
+	def schedule(self, delay, callback):
+		# seq keeps events scheduled for the same tick in FIFO order
+		heapq.heappush(self.queue, (self.now + delay, self.seq, callback))
+		self.seq += 1
+
+	def until_next(self): return self.queue[0][0] - self.now if self.queue else math.inf
+
+	def advance(self, ticks):
+		self.now += ticks
+		while self.queue and self.queue[0][0] <= self.now: heapq.heappop(self.queue)[2]()
+
+class Governor:
+	'''
+	Speed governor. Compares the instructions executed since the last reset (counted in
+	`executed` by Core.count_ips) with the time real hardware, running at `rate`
+	instructions per second times `speed`, would have taken for them. When the emulator is
+	at least `slice` seconds ahead, delay() returns the time to sleep; sleeping in coarse
+	slices keeps the number of sleeps (and their overshoot) low.
+	If the emulator falls more than `max_lag` seconds behind, the deficit is dropped
+	instead of being made up with a burst of unthrottled execution. A speed of 0 is unlimited.
+	'''
+	def __init__(self, rate, speed = 1, slice = 0.01, max_lag = 0.25):
+		self.rate = rate
+		self.speed = speed
+		self.slice = slice
+		self.max_lag = max_lag
+		self.reset()
+
+	def reset(self):
+		self.start = time.perf_counter()
+		self.executed = 0
+
+	def set_speed(self, speed):
+		self.speed = speed
+		self.reset()
+
+	def delay(self):
+		if not self.speed: return 0
+		ahead = self.executed / (self.rate * self.speed) - (time.perf_counter() - self.start)
+		if ahead >= self.slice: return ahead
+		if ahead < -self.max_lag: self.reset()
+		return 0
+
+	def percent(self, ips): return ips / self.rate * 100
+
+class Breakpoint:
+	__slots__ = ('addr', 'condition', 'code', 'enabled', 'hits')
+
+	def __init__(self, addr, condition = None):
+		self.addr = addr
+		self.condition = condition
+		self.code = compile(condition, '<breakpoint condition>', 'eval') if condition else None
+		self.enabled = True
+		self.hits = 0
+
+class Breakpoints:
+	'''
+	Execute breakpoints. `bitmap` has one byte per CSR:PC (16 segments of 64K), set for
+	every enabled breakpoint, so the execution loops only need `bitmap[(csr << 16) + pc]`
+	to know whether to look any further.
+
+	A condition is a Python expression evaluated when the breakpoint is reached; it can use
+	the register names (CSR, PC, SP, PSW, DSR, EA, LCSR, LR, ECSR1, ...), R0-R15, ER0-ER14
+	and mem(addr, num_bytes = 1, segment = 0). Breakpoints without a condition always hit.
+
+	`temporary` is an address to stop at unconditionally, set by Core.run for `until`,
+	regardless of any breakpoint there.
+	'''
+	def __init__(self):
+		self.bitmap = bytearray(0x100000)
+		self.entries = {}
+		self.temporary = None
+
+	def update_bitmap(self, addr):
+		bp = self.entries.get(addr)
+		self.bitmap[addr] = addr == self.temporary or (bp is not None and bp.enabled)
+
+	def add(self, addr, condition = None):
+		self.entries[addr] = Breakpoint(addr, condition)
+		self.update_bitmap(addr)
+
+	def remove(self, addr):
+		if self.entries.pop(addr, None) is not None: self.update_bitmap(addr)
+
+	def set_enabled(self, addr, val):
+		if addr not in self.entries: return
+		self.entries[addr].enabled = val
+		self.update_bitmap(addr)
+
+	def set_temporary(self, addr):
+		old = self.temporary
+		self.temporary = addr
+		if old is not None: self.update_bitmap(old)
+		if addr is not None: self.update_bitmap(addr)
+
+	def clear(self):
+		addrs = list(self.entries)
+		self.entries.clear()
+		for addr in addrs: self.update_bitmap(addr)
+
+	def check(self, core, addr):
+		'''
+		Called when `bitmap[addr]` is set. Returns whether execution stops there, counting
+		the hit if it is a breakpoint.
+		'''
+		if addr == self.temporary: return True
+		bp = self.entries.get(addr)
+		if bp is None or not bp.enabled: return False
+		if bp.code is not None:
+			names = {name: var.value for name, var in core.cpu.scalars}
+			gr = bytes(core.cpu.gr)
+			names.update({f'R{i}': gr[i] for i in range(16)})
+			names.update({f'ER{i}': gr[i] | (gr[i+1] << 8) for i in range(0, 16, 2)})
+			names['mem'] = lambda addr, num_bytes = 1, segment = 0: core.read_dmem(addr, num_bytes, segment)
+			try:
+				if not eval(bp.code, {'__builtins__': {}}, names): return False
+			except Exception as e: logging.error(f'breakpoint {addr >> 16:X}:{addr & 0xffff:04X}H condition {bp.condition!r}: {e}')
+		bp.hits += 1
+		return True
+
+class Watchpoint:
+	__slots__ = ('addr', 'length', 'value', 'hits')
+
+	def __init__(self, addr, length = 1, value = None):
+		self.addr = addr
+		self.length = length
+		self.value = value
+		self.hits = 0
+
+class Watchpoints:
+	'''
+	Data memory watchpoints on 00:8000H - 00:FFFFH. A watchpoint hits when its range
+	changes, or, if `value` is given, when it changes to `value`.
+
+	Only the 256-byte pages that contain a watched range are kept (in `pages`) and compared
+	against data memory after every step or burst, so a hit is found at the end of the
+	burst in which the write happened.
+	'''
+	def __init__(self):
+		self.entries = {}
+		self.pages = {}
+
+	@staticmethod
+	def page_range(wp): return range((wp.addr - 0x8000) >> 8, ((wp.addr + wp.length - 1 - 0x8000) >> 8) + 1)
+
+	def add(self, dmem, addr, length = 1, value = None):
+		self.entries[(addr, length)] = Watchpoint(addr, length, value)
+		self.sync(dmem)
+
+	def remove(self, dmem, key):
+		self.entries.pop(key, None)
+		self.sync(dmem)
+
+	def clear(self):
+		self.entries.clear()
+		self.pages.clear()
+
+	def sync(self, dmem):
+		'''
+		Takes the current contents of the watched pages as the new baseline, e.g. after data
+		memory has been written from outside the ROM.
+		'''
+		self.pages = {page: bytes(dmem[page << 8:(page + 1) << 8]) for wp in self.entries.values() for page in self.page_range(wp)}
+
+	def check(self, dmem):
+		'''
+		Returns a list of (watchpoint, old bytes, new bytes) for the watchpoints that hit.
+		'''
+		old_pages = {}
+		for page, old in self.pages.items():
+			new = dmem[page << 8:(page + 1) << 8]
+			if new != old: old_pages[page] = old
+		if not old_pages: return []
+
+		for page in old_pages: self.pages[page] = bytes(dmem[page << 8:(page + 1) << 8])
+
+		hits = []
+		for wp in self.entries.values():
+			pages = self.page_range(wp)
+			if not any(page in old_pages for page in pages): continue
+
+			start = (wp.addr - 0x8000) - (pages[0] << 8)
+			old = b''.join(old_pages.get(page, self.pages[page]) for page in pages)[start:start + wp.length]
+			new = b''.join(self.pages[page] for page in pages)[start:start + wp.length]
+			if old != new and (wp.value is None or new == wp.value):
+				wp.hits += 1
+				hits.append((wp, old, new))
+		return hits
+
+class Journal:
+	'''
+	Rewind journal for stepping backwards. Every instruction executed through core_step
+	(single-step or precise mode) records an undo delta: the raw registers and frontend
+	state from before it, and the old contents of the data memory bytes it changed. A full
+	keyframe (registers, frontend state, compressed data memory) is also kept every
+	`interval` steps, so rewinding far only undoes the deltas after the nearest keyframe.
+	At most `depth` steps are kept.
+
+	Memory changes are found by comparing data memory with a copy of it (`last`); see
+	changed_ranges. If the state changed in between steps (bursts, commands, loading a
+	state), the journal starts over from there.
+
+	The journal is only needed for stepping back in the GUI; headless, batch and benchmark
+	runs set `depth` to 0, which turns it off.
+	'''
+	def __init__(self, core, depth, interval):
+		self.core = core
+		self.depth = depth
+		self.interval = interval
+		self.clear()
+		self.rewind_time = 0
+
+	def clear(self):
+		self.deltas = collections.deque()
+		self.keyframes = {}
+		self.steps = 0
+		self.last = None
+		self.last_regs = None
+		self.pending = None
+		self.size = 0
+
+	def begin(self):
+		core = self.core
+		regs = core.cpu.save_raw()
+		if self.last is not None and (regs != self.last_regs or bytes(core.dmem) != self.last): self.clear()
+		if self.last is None: self.last = bytearray(core.dmem)
+
+		front = core.frontend_state()
+		if self.steps % self.interval == 0 and self.steps not in self.keyframes:
+			keyframe = (regs, front, zlib.compress(self.last, 1))
+			self.keyframes[self.steps] = keyframe
+			self.size += len(regs) + len(keyframe[2])
+		self.pending = (regs, front)
+
+	@staticmethod
+	def changed_ranges(new, old):
+		'''
+		Returns the (start, end) range of the changed bytes in every 256-byte page where `new`
+		and `old` differ. Both are compared as bytes (a memcmp per slice; comparing memoryviews
+		goes element by element), first in 4 KB blocks and then page by page within the blocks
+		that differ. Within a changed page, the first and last changed byte are found from the
+		XOR of the page as an int, so no byte is looked at in Python.
+		'''
+		ranges = []
+		if new == old: return ranges
+		for block in range(0, len(new), 0x1000):
+			if new[block:block + 0x1000] == old[block:block + 0x1000]: continue
+			for page in range(block, block + 0x1000, 0x100):
+				if new[page:page + 0x100] == old[page:page + 0x100]: continue
+				diff = int.from_bytes(new[page:page + 0x100], 'little') ^ int.from_bytes(old[page:page + 0x100], 'little')
+				ranges.append((page + (((diff & -diff).bit_length() - 1) >> 3), page + ((diff.bit_length() + 7) >> 3)))
+		return ranges
+
+	def end(self):
+		dmem = bytes(self.core.dmem)
+		last = self.last
+		changes = []
+		size = 0
+		for start, end in self.changed_ranges(dmem, last):
+			changes.append((start, bytes(last[start:end])))
+			last[start:end] = dmem[start:end]
+			size += end - start + 8
+
+		regs, front = self.pending
+		self.deltas.append((regs, front, changes))
+		self.size += len(regs) + size
+		self.steps += 1
+		self.last_regs = self.core.cpu.save_raw()
+
+		if len(self.deltas) > self.depth:
+			self.size -= self.delta_size(self.deltas.popleft())
+			for step in [step for step in self.keyframes if step < self.steps - len(self.deltas)]: self.drop_keyframe(step)
+
+	@staticmethod
+	def delta_size(delta): return len(delta[0]) + sum(len(old) + 8 for _, old in delta[2])
+
+	def drop_keyframe(self, step):
+		regs, _, dmem = self.keyframes.pop(step)
+		self.size -= len(regs) + len(dmem)
+
+	def rewind(self, num):
+		'''
+		Goes back `num` steps (at most as many as recorded). Returns the number of steps
+		rewound.
+		'''
+		start = time.perf_counter()
+		num = min(num, len(self.deltas))
+		if num <= 0: return 0
+		target = self.steps - num
+		core = self.core
+
+		keyframes = [step for step in self.keyframes if target <= step < self.steps]
+		step = min(keyframes) if keyframes else self.steps
+		if step - target < num:
+			# Restore the nearest keyframe above the target, dropping the deltas after it
+			for _ in range(self.steps - step): self.size -= self.delta_size(self.deltas.pop())
+			regs, front, dmem = self.keyframes[step]
+			self.last[:] = zlib.decompress(dmem)
+		else: regs, front = None, None
+
+		while step > target:
+			delta = self.deltas.pop()
+			self.size -= self.delta_size(delta)
+			regs, front, changes = delta
+			for offset, old in changes: self.last[offset:offset + len(old)] = old
+			step -= 1
+
+		for step in [step for step in self.keyframes if step > target]: self.drop_keyframe(step)
+		self.steps = target
+		core.dmem[:] = self.last
+		core.cpu.load_raw(regs)
+		core.set_frontend_state(front)
+		self.last_regs = regs
+
+		self.rewind_time = time.perf_counter() - start
+		return num
+
+class Core:
+	'''
+	SimU8 core, memory and peripherals, without any GUI. The frontend (main.Sim) builds on
+	this; it can also be driven directly, e.g. by the headless runner.
+	'''
+	def __init__(self, config):
+		self.config = config
+		self.sim = load_library(config)
+		self.cpu = CpuState(self.sim)
+		self.map_dmem()
+
+		self.keys_pressed = set()
+
+		self.single_step = True
+		self.ok = True
+		self.breakpoints = Breakpoints()
+		self.watchpoints = Watchpoints()
+		self.trace = None
+		self.disassembler = disasm.Disassembler(config.disas_cache_size)
+		self.journal = Journal(self, config.rewind_depth, config.rewind_keyframe_interval)
+		self.stats = stats.Stats(config.stats_enabled)
+		self.governor = Governor(config.cpu_clock / config.cycles_per_instruction, config.speed)
+
+		self.prev_csr_pc = None
+		self.last_ready = 0
+		self.stop_accept = [False, False]
+		self.stop_mode = False
+
+		self.scheduler = EventScheduler()
+		self.timer_synced = 0
+		self.scheduler.schedule(config.periph_interval, self.sync_peripherals)
+
+		self.precise_mode = config.precise_mode
+		self.instructions = 0
+		self.ips = 0
+		self.ips_start = time.perf_counter()
+		self.ips_ctr = 0
+
+	def map_dmem(self):
+		'''
+		Builds persistent zero-copy views over SimU8's data memory (00:8000H - 00:FFFFH).
+		Reads and writes through these views touch the DataMemory buffer directly instead
+		of going through memoryGetData/memorySetData.
+		'''
+		self.dmem = memoryview((ctypes.c_uint8 * 0x8000).from_address(self.cpu.data_memory.value)).cast('B')
+		self.ram = self.dmem[:0x7000]          # 00:8000H - 00:EFFFH
+		self.sfr = self.dmem[0x7000:]          # 00:F000H - 00:FFFFH
+		self.lcd = self.dmem[0x7800:0x7a00]    # 00:F800H - 00:F9FFH, 0x20 rows of 0x10 bytes
+		self.lcd_buf = self.dmem[0x7d0:0x950]  # 00:87D0H - 00:894FH, 0x20 rows of 0xC bytes
+
+	@staticmethod
+	def in_dmem(addr, num_bytes, segment):
+		return segment == 0 and addr >= 0x8000 and addr + num_bytes <= 0x10000
+
+	def read_dmem(self, addr, num_bytes, segment = 0):
+		if self.in_dmem(addr, num_bytes, segment): return int.from_bytes(self.dmem[addr - 0x8000:addr - 0x8000 + num_bytes], 'little')
+		if self.stats.enabled: self.stats.count('memoryGetData')
+		return self.sim.memoryGetData(ctypes.c_uint8(segment), ctypes.c_uint16(addr), ctypes.c_size_t(num_bytes))
+
+	def read_dmem_bytes(self, addr, num_bytes, segment = 0):
+		if self.in_dmem(addr, num_bytes, segment): return bytes(self.dmem[addr - 0x8000:addr - 0x8000 + num_bytes])
+		if self.stats.enabled: self.stats.count('memoryGetData', (num_bytes + 7) // 8)
+		return read_mem_bytes(self.sim, addr, num_bytes, segment)
+
+	def write_dmem(self, addr, num_bytes, data, segment = 0):
+		if self.in_dmem(addr, num_bytes, segment): self.dmem[addr - 0x8000:addr - 0x8000 + num_bytes] = (data & ((1 << num_bytes*8) - 1)).to_bytes(num_bytes, 'little')
+		else:
+			if self.stats.enabled: self.stats.count('memorySetData')
+			self.sim.memorySetData(ctypes.c_uint8(segment), ctypes.c_uint16(addr), ctypes.c_size_t(num_bytes), ctypes.c_uint64(data))
+
+	def write_dmem_bytes(self, addr, data, segment = 0):
+		if self.in_dmem(addr, len(data), segment):
+			self.dmem[addr - 0x8000:addr - 0x8000 + len(data)] = data
+			return
+
+		index = 0
+		while index < len(data):
+			num = min(len(data) - index, 8)
+			self.write_dmem(addr + index, num, int.from_bytes(data[index:index+num], 'little'), segment)
+			index += num
+
+	def read_cmem(self, addr, segment = 0):
+		if self.stats.enabled: self.stats.count('memoryGetCodeWord')
+		return self.sim.memoryGetCodeWord(ctypes.c_uint8(segment), ctypes.c_uint16(addr))
+
+	def set_csr_pc(self, csr, pc):
+		self.cpu.csr.value = csr
+		self.cpu.pc.value = pc
+
+	def press_key(self, key):
+		'''
+		Presses the key at (KI, KO) `key`, through KI/KO on real ROMs or the key buffer at
+		00:8E01H on emulator ROMs.
+		'''
+		if self.config.real_hardware: self.keys_pressed.add(key)
+		else: self.write_dmem_bytes(0x8e01, bytes((1 << key[0], 1 << key[1])))
+
+	def release_keys(self):
+		if self.config.real_hardware: self.keys_pressed.clear()
+		else: self.write_dmem_bytes(0x8e01, bytes(2))
+
+	def keyboard(self):
+		if self.config.real_hardware:
+			self.write_dmem(0xf040, 1, self.scan_keys(self.read_dmem(0xf046, 1)))
+			if len(self.keys_pressed) > 0: self.write_dmem(0xf014, 1, 2)
+		else:
+			ready = self.read_dmem(0x8e00, 1)
+
+			if not self.last_ready and ready:
+				self.write_dmem(0x8e01, 1, 0)
+				self.write_dmem(0x8e02, 1, 0)
+			
+			self.last_ready = ready
+
+	def scan_keys(self, ko):
+		ki = 0xff
+		for ki_val, ko_val in self.keys_pressed:
+			if ko & (1 << ko_val): ki &= ~(1 << ki_val)
+		return ki
+
+	def sbycon(self):
+		if self.read_dmem(0xf009, 1) == 2 and all(self.stop_accept): self.enter_stop()
+
+	def enter_stop(self):
+		self.stop_mode = True
+		self.write_dmem(0xf009, 1, 0)
+		self.write_dmem(0xf008, 0, 0)
+		self.stop_accept[:] = [False, False]
+
+		# Schedule the wakeup for the tick where the counter reaches the target
+		self.sync_timer()
+		counter = self.read_dmem(0xf022, 2)
+		target = self.read_dmem(0xf020, 2)
+		self.scheduler.schedule(max(target - counter, 1), self.sync_timer)
+
+	def timer(self, ticks = 1):
+		counter = self.read_dmem(0xf022, 2)
+		target = self.read_dmem(0xf020, 2)
+
+		counter += ticks
+		counter &= 0xffff
+
+		self.write_dmem(0xf022, 2, counter)
+
+		if counter >= target and self.stop_mode:
+			self.stop_mode = False
+			if self.config.real_hardware: self.write_dmem(0xf014, 1, 0x20)
+
+	def sync_timer(self):
+		'''
+		Brings the timer counter up to the scheduler's current tick.
+		'''
+		ticks = self.scheduler.now - self.timer_synced
+		self.timer_synced = self.scheduler.now
+		if ticks: self.timer(ticks)
+
+	def sync_peripherals(self):
+		'''
+		Periodic event: publishes the timer counter to the ROM and keeps the key interrupt
+		asserted while keys are held (or polls the emulator ROM's key buffer).
+		'''
+		self.sync_timer()
+		if not self.config.real_hardware: self.keyboard()
+		elif self.keys_pressed: self.write_dmem(0xf014, 1, 2)
+		self.scheduler.schedule(self.config.periph_interval, self.sync_peripherals)
+
+	def core_step(self):
+		cpu = self.cpu
+		timed = self.stats.enabled
+		if timed: start = time.perf_counter_ns()
+		if self.journal.depth: self.journal.begin()
+		self.prev_csr_pc = (cpu.csr.value, cpu.pc.value)
+
+		self.keyboard()
+		self.sbycon()
+		self.scheduler.advance(1)
+		self.sync_timer()
+		if timed: start = self.time_phase('peripherals', start)
+
+		if not self.stop_mode:
+			self.ok = False
+			retval = None
+			if self.trace is not None: self.trace.record(*self.prev_csr_pc)
+			try: retval = self.sim.coreStep()
+			except Exception as e: logging.error(str(e))
+			if timed:
+				start = self.time_phase('coreStep', start)
+				self.stats.count('coreStep')
+
+			self.log_retval(retval, cpu.csr.value, cpu.pc.value)
+
+			stpacp = self.read_dmem(0xf008, 1)
+			if self.stop_accept[0]:
+				if stpacp & 0xa0 == 0xa0 and not self.stop_accept[1]: self.stop_accept[1] = True
+			elif stpacp & 0x50 == 0x50: self.stop_accept[0] = True
+
+			self.ok = True
+			self.count_ips(1)
+
+		csr = cpu.csr.value
+		pc = cpu.pc.value
+		if self.journal.depth: self.journal.end()
+		if self.breakpoints.bitmap[(csr << 16) + pc] and self.breakpoints.check(self, (csr << 16) + pc): self.hit_brkpoint(csr, pc)
+		if self.watchpoints.entries: self.check_watchpoints()
+		if timed: self.time_phase('step_checks', start)
+
+	def time_phase(self, phase, start):
+		now = time.perf_counter_ns()
+		self.stats.add(phase, now - start)
+		return now
+
+	def core_step_burst(self, limit = None):
+		'''
+		Runs up to `limit` ticks (default: config.burst_size), calling coreStep in a tight
+		loop between scheduled peripheral events. Within the loop, only the cheap checks that have to
+		see every instruction are done: KI is rescanned when the ROM writes KO while keys
+		are held, and STPACP/SBYCON are watched for the STOP mode sequence.
+		'''
+		core_step = self.sim.coreStep
+		csr = self.cpu.csr
+		pc = self.cpu.pc
+		sfr = self.sfr
+		scheduler = self.scheduler
+		stop_accept = self.stop_accept
+		breakpoints = self.breakpoints
+		bitmap = breakpoints.bitmap
+		record = self.trace.record if self.trace is not None else None
+		if limit is None: limit = self.config.burst_size
+
+		scanning = self.config.real_hardware and len(self.keys_pressed) > 0
+		if self.config.real_hardware: sfr[0x40] = self.scan_keys(sfr[0x46])
+		ko = sfr[0x46]
+
+		c, p = csr.value, pc.value
+		prev = self.prev_csr_pc
+		executed = 0
+		ticks = 0
+		hit = False
+		timed = self.stats.enabled
+
+		while ticks < limit and not hit and not self.single_step and not self.stop_mode:
+			count = min(limit - ticks, scheduler.until_next())
+			stopping = False
+			done = 0
+			if timed: start = time.perf_counter_ns()
+			while done < count:
+				prev = (c, p)
+				if record is not None: record(c, p)
+				retval = core_step()
+				c, p = csr.value, pc.value
+				done += 1
+
+				if retval in (2, 3): self.log_retval(retval, c, p)
+
+				if scanning and sfr[0x46] != ko:
+					ko = sfr[0x46]
+					sfr[0x40] = self.scan_keys(ko)
+
+				if stop_accept[1]:
+					if sfr[9] == 2:
+						stopping = True
+						break
+				elif stop_accept[0]:
+					if sfr[8] & 0xa0 == 0xa0: stop_accept[1] = True
+				elif sfr[8] & 0x50 == 0x50: stop_accept[0] = True
+
+				if bitmap[(c << 16) + p] and breakpoints.check(self, (c << 16) + p):
+					hit = True
+					break
+
+			if timed:
+				start = self.time_phase('burst', start)
+				self.stats.count('coreStep', done)
+			scheduler.advance(done)
+			ticks += done
+			executed += done
+			if stopping: self.enter_stop()
+			if timed: self.time_phase('events', start)
+
+		self.prev_csr_pc = prev
+		self.count_ips(executed)
+		if hit: self.hit_brkpoint(c, p)
+		if self.watchpoints.entries: self.check_watchpoints()
+
+	def log_retval(self, retval, csr, pc):
+		if retval == 2: logging.warning(f'unimplemented instruction @ {csr:X}:{(pc - 2) & 0xffff:04X}H')
+		elif retval == 3: logging.error(f'illegal instruction @ {csr:X}:{pc:04X}H')
+		else: return
+		if self.trace is not None:
+			logging.warning('last instructions executed:')
+			self.trace.log_tail()
+
+	def hit_brkpoint(self, csr, pc):
+		self.single_step = True
+
+	def start_trace(self, path = None):
+		'''
+		Starts recording an instruction trace (see tracer.Trace), streamed to `path` if given.
+		'''
+		self.stop_trace()
+		self.trace = tracer.Trace(self.cpu, self.config.trace_depth, self.config.trace_sp_ea)
+		if path is not None: self.trace.open(path)
+
+	def stop_trace(self):
+		if self.trace is None: return
+		self.trace.close()
+		self.trace = None
+
+	def check_watchpoints(self):
+		hits = self.watchpoints.check(self.dmem)
+		if hits: self.hit_watchpoint(hits)
+
+	def hit_watchpoint(self, hits):
+		self.single_step = True
+
+	def count_ips(self, executed):
+		self.instructions += executed
+		self.governor.executed += executed
+		self.ips_ctr += executed
+		if self.ips_ctr < 1000: return
+
+		cur = time.perf_counter()
+		try: self.ips = self.ips_ctr / (cur - self.ips_start)
+		except ZeroDivisionError: self.ips = None
+		self.ips_start = cur
+		self.ips_ctr = 0
+
+	def read_code_segment(self, csr):
+		return disasm.to_bytes(self.read_cmem(addr, csr) for addr in range(0, 0x10000, 2))
+
+	def index_segment(self, csr):
+		'''
+		Starts disassembling code segment `csr` in the background (see disasm.Disassembler).
+		The code is read here, so this has to run on the thread that owns SimU8.
+		'''
+		if csr in self.disassembler.index or csr in self.disassembler.indexing: return
+		self.disassembler.index_segment(csr, self.read_code_segment(csr))
+
+	def core_reset(self, single_step = True):
+		self.sim.coreReset()
+		self.prev_csr_pc = None
+		self.single_step = single_step
+		self.governor.reset()
+
+	def cold_reset(self, dmem = None):
+		'''
+		Resets the core along with all peripheral and scheduler state, so that every run
+		starts out the same. If `dmem` is given, data memory is restored from it.
+		'''
+		if dmem is not None: self.dmem[:] = dmem
+		self.keys_pressed.clear()
+		self.breakpoints.clear()
+		self.watchpoints.clear()
+		self.journal.clear()
+		self.last_ready = 0
+		self.stop_accept[:] = [False, False]
+		self.stop_mode = False
+
+		self.scheduler = EventScheduler()
+		self.timer_synced = 0
+		self.scheduler.schedule(self.config.periph_interval, self.sync_peripherals)
+		self.instructions = 0
+
+		self.core_reset(False)
+
+	def stop_remaining(self):
+		'''
+		Returns the number of ticks left until the timer match that ends STOP mode.
+		'''
+		self.sync_timer()
+		return max(self.read_dmem(0xf020, 2) - self.read_dmem(0xf022, 2), 1)
+
+	def run(self, max_instructions = None, until = None):
+		'''
+		Runs without pausing for real time: STOP mode is skipped straight to the timer match.
+		Stops after `max_instructions` instructions, when CSR:PC reaches `until` (given as
+		(CSR << 16) + PC), or at a breakpoint. Returns the number of instructions executed.
+		'''
+		start = self.instructions
+		self.breakpoints.set_temporary(until)
+		self.single_step = False
+
+		try:
+			while not self.single_step:
+				left = None if max_instructions is None else max_instructions - (self.instructions - start)
+				if left is not None and left <= 0: break
+
+				if self.stop_mode: self.scheduler.advance(self.stop_remaining())
+				elif self.precise_mode: self.core_step()
+				else: self.core_step_burst(left if left is not None and left < self.config.burst_size else None)
+		finally: self.breakpoints.set_temporary(None)
+
+		return self.instructions - start
+
+	def dump(self, path):
+		'''
+		Writes the register set (registers.json), data memory 00:8000H - 00:FFFFH (dmem.bin)
+		and the LCD (lcd.pbm) to the directory `path`.
+		'''
+		os.makedirs(path, exist_ok = True)
+
+		regs = self.cpu.snapshot()
+		regs['GR'] = regs['GR'].hex()
+		regs['ticks'] = self.scheduler.now
+		regs['instructions'] = self.instructions
+		with open(os.path.join(path, 'registers.json'), 'w') as f: json.dump(regs, f, indent = 4)
+
+		with open(os.path.join(path, 'dmem.bin'), 'wb') as f: f.write(self.dmem)
+
+		# Binary PBM rows are 1 bit per pixel, MSB first, set = black, same as the VRAM rows.
+		with open(os.path.join(path, 'lcd.pbm'), 'wb') as f:
+			f.write(b'P4\n96 32\n' + b''.join(self.lcd[i*0x10:i*0x10+0xc] for i in range(0x20)))
+
+	def save_state(self, path):
+		'''
+		Saves the machine state to `path`. Registers and data memory are copied as whole
+		buffers. Returns the time taken in seconds.
+		'''
+		start = time.perf_counter()
+		self.sync_timer()
+		state = {
+			'stop_mode': self.stop_mode,
+			'stop_accept': self.stop_accept,
+			'last_ready': self.last_ready,
+			'ticks': self.scheduler.now,
+			'instructions': self.instructions,
+			'prev_csr_pc': self.prev_csr_pc,
+			'breakpoints': [(bp.addr, bp.condition, bp.enabled) for bp in self.breakpoints.entries.values()],
+		}
+		state = json.dumps(state).encode()
+		payload = b''.join((struct.pack('<I', len(state)), state, self.cpu.save_raw(), self.dmem))
+
+		os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok = True)
+		with open(path, 'wb') as f: f.write(STATE_MAGIC + STATE_HEADER.pack(STATE_VERSION, len(payload)) + zlib.compress(payload, 1))
+		return time.perf_counter() - start
+
+	def read_state(self, path):
+		'''
+		Reads a save state written by save_state and checks all of it without changing
+		anything. Returns (frontend state, breakpoints, raw registers, data memory). Raises
+		ValueError saying what is wrong if the file is missing, truncated or not a save state.
+		'''
+		try:
+			with open(path, 'rb') as f: data = f.read()
+		except OSError as e: raise ValueError(f'could not read {path}: {e.strerror}') from e
+		if data[:len(STATE_MAGIC)] != STATE_MAGIC or len(data) < len(STATE_MAGIC) + STATE_HEADER.size: raise ValueError(f'{path} is not a save state')
+		version, size = STATE_HEADER.unpack_from(data, len(STATE_MAGIC))
+		if version != STATE_VERSION: raise ValueError(f'{path} has unsupported save state version {version}')
+
+		raw_size = self.cpu.raw_size
+		try:
+			payload = zlib.decompress(data[len(STATE_MAGIC) + STATE_HEADER.size:])
+			if len(payload) != size: raise ValueError(f'{len(payload)} bytes instead of {size}')
+			state_len = struct.unpack_from('<I', payload)[0]
+			state = json.loads(payload[4:4 + state_len])
+			pos = 4 + state_len
+			regs, dmem = payload[pos:pos + raw_size], payload[pos + raw_size:]
+			if len(regs) != raw_size or len(dmem) != 0x8000: raise ValueError('wrong register or data memory size')
+
+			prev_csr_pc = state['prev_csr_pc']
+			front = (bool(state['stop_mode']), tuple(bool(i) for i in state['stop_accept']), int(state['last_ready']), int(state['ticks']), int(state['instructions']), tuple(prev_csr_pc) if prev_csr_pc is not None else None)
+			if len(front[1]) != 2: raise ValueError('wrong STOP mode state')
+			breakpoints = []
+			for addr, condition, enabled in state['breakpoints']:
+				if not 0 <= addr < 0x100000: raise ValueError(f'breakpoint address {addr:X} out of range')
+				if condition: compile(condition, '<breakpoint condition>', 'eval')
+				breakpoints.append((addr, condition, bool(enabled)))
+		except KeyError as e: raise ValueError(f'{path} is corrupted: no {e} field') from e
+		except (zlib.error, struct.error, ValueError, TypeError, SyntaxError) as e: raise ValueError(f'{path} is corrupted: {e}') from e
+		return front, breakpoints, regs, dmem
+
+	def load_state(self, path):
+		'''
+		Restores the machine state saved by save_state. The file is checked in full first
+		(see read_state), so a bad file raises ValueError and leaves the state as it was.
+		Returns the time taken in seconds.
+		'''
+		start = time.perf_counter()
+		front, breakpoints, regs, dmem = self.read_state(path)
+		self.cpu.load_raw(regs)
+		self.dmem[:] = dmem
+		self.set_frontend_state(front)
+
+		self.breakpoints.clear()
+		for addr, condition, enabled in breakpoints:
+			self.breakpoints.add(addr, condition)
+			self.breakpoints.set_enabled(addr, enabled)
+		self.watchpoints.sync(self.dmem)
+		self.journal.clear()
+		self.governor.reset()
+		return time.perf_counter() - start
+
+	def take_snapshot(self, seq = 0):
+		regs = self.cpu.snapshot()
+		return Snapshot(
+			seq = seq,
+			regs = regs,
+			code = tuple(self.read_cmem((regs['PC'] + i*2) & 0xfffe, regs['CSR']) for i in range(3)),
+			dmem = bytes(self.dmem),
+			prev_csr_pc = self.prev_csr_pc,
+			stop_accept = tuple(self.stop_accept),
+			stop_mode = self.stop_mode,
+			ips = self.ips,
+			single_step = self.single_step,
+			ticks = self.scheduler.now,
+			breakpoints = tuple((addr, bp.condition, bp.enabled, bp.hits) for addr, bp in sorted(self.breakpoints.entries.items())),
+			watchpoints = tuple((key, wp.value, wp.hits) for key, wp in sorted(self.watchpoints.entries.items())),
+		)
+
+	def frontend_state(self):
+		return (self.stop_mode, tuple(self.stop_accept), self.last_ready, self.scheduler.now, self.instructions, self.prev_csr_pc)
+
+	def set_frontend_state(self, state):
+		self.stop_mode, stop_accept, self.last_ready, ticks, self.instructions, self.prev_csr_pc = state
+		self.stop_accept[:] = stop_accept
+		self.reset_scheduler(ticks)
+
+	def reset_scheduler(self, ticks):
+		'''
+		Replaces the event scheduler with one starting at tick `ticks`, with the peripheral
+		events (and the STOP mode wakeup, if in STOP mode) scheduled again.
+		'''
+		self.scheduler = EventScheduler()
+		self.scheduler.now = self.timer_synced = ticks
+		self.scheduler.schedule(self.config.periph_interval, self.sync_peripherals)
+		if self.stop_mode: self.scheduler.schedule(self.stop_remaining(), self.sync_timer)
+
+	def state_path(self, slot):
+		return os.path.join(self.config.save_state_dir, f'slot{slot}.u8s')
+
+def headless(config, instructions = None, until = None, dump_dir = None, precise = False, trace = None, load_state = None, save_state = None, stats_path = None):
+	'''
+	Entry point for main.py --headless. Runs the ROM from reset and prints the throughput.
+	'''
+	core = Core(config)
+	core.journal.depth = 0
+	if precise: core.precise_mode = True
+	if stats_path is not None: core.stats.enabled = True
+	if trace is not None: core.start_trace(trace)
+	core.core_reset(False)
+	if load_state is not None:
+		try: core.load_state(core.state_path(load_state) if load_state.isdigit() else load_state)
+		except ValueError as e:
+			logging.error(e)
+			core.sim.memoryFree()
+			raise SystemExit(1)
+
+	start = time.perf_counter()
+	start_count = core.instructions
+	try: executed = core.run(instructions, until)
+	except KeyboardInterrupt: executed = core.instructions - start_count
+	elapsed = time.perf_counter() - start
+
+	csr, pc = core.cpu.csr.value, core.cpu.pc.value
+	print(f'Stopped at {csr:X}:{pc:04X}H after {executed} instructions ({core.scheduler.now} ticks)')
+	try: print(f'{elapsed:.3f} s, {executed / elapsed:.1f} instructions per second, {core.governor.percent(executed / elapsed):.0f}% of real hardware ({"precise" if core.precise_mode else "burst"} mode)')
+	except ZeroDivisionError: pass
+
+	core.stop_trace()
+	if stats_path is not None: core.stats.dump(stats_path)
+	if dump_dir is not None: core.dump(dump_dir)
+	if save_state is not None: core.save_state(core.state_path(save_state) if save_state.isdigit() else save_state)
+	core.sim.memoryFree()
@@ -0,0 +1,82 @@
+import logging
+import threading
+import collections
+
+from pyu8disas import main as disas
+
+# pyu8disas keeps its input in module globals, so only one thread can decode at a time.
+lock = threading.RLock()
+
+def decode(code):
+	'''
+	Decodes the instruction at the start of `code` (bytes). Returns the instruction text
+	and its length in bytes, including a DSR prefix.
+	'''
+	with lock:
+		disas.input_file = code
+		disas.addr = 0
+		ins_str, _, dsr_prefix, _ = disas.decode_ins()
+		if dsr_prefix: ins_str, _, _, _ = disas.decode_ins()
+		return ins_str, disas.addr
+
+def to_bytes(words): return b''.join(word.to_bytes(2, 'little') for word in words)
+
+class Disassembler:
+	'''
+	Memoized disassembly. Instructions are looked up by CSR:PC together with the code
+	words there, so nothing stale is returned if the code differs (e.g. another ROM):
+	- `index` holds whole code segments disassembled in the background by index_segment,
+	  as CSR -> {PC: (code words, text)}, following instruction boundaries from 0000H
+	- everything else goes through an LRU cache of `cache_size` entries
+	'''
+	def __init__(self, cache_size):
+		self.cache = collections.OrderedDict()
+		self.cache_size = cache_size
+		self.index = {}
+		self.indexing = set()
+
+	def instruction(self, csr, pc, code):
+		'''
+		Returns the text of the instruction at CSR:PC, given the code words there (at least 3).
+		'''
+		code = tuple(code)
+		entry = self.index.get(csr, {}).get(pc)
+		if entry is not None and code[:len(entry[0])] == entry[0]: return entry[1]
+
+		key = (csr, pc, code)
+		with lock:
+			text = self.cache.get(key)
+			if text is not None:
+				self.cache.move_to_end(key)
+				return text
+
+			text = decode(to_bytes(code))[0]
+			self.cache[key] = text
+			if len(self.cache) > self.cache_size: self.cache.popitem(last = False)
+		return text
+
+	def index_segment(self, csr, data):
+		'''
+		Disassembles the 64 KB code segment `data` (bytes) in a background thread and
+		publishes it in `index` when done.
+		'''
+		if csr in self.index or csr in self.indexing: return
+		self.indexing.add(csr)
+		threading.Thread(target = self.build_index, args = (csr, data), daemon = True).start()
+
+	def build_index(self, csr, data):
+		index = {}
+		data = data + bytes(6)
+		pc = 0
+		try:
+			while pc < 0x10000:
+				code = data[pc:pc + 6]
+				try: text, length = decode(code)
+				except Exception: text, length = None, 0
+				if text is None or length <= 0: text, length = f'DW {int.from_bytes(code[:2], "little"):04X}H', 2
+				length += length & 1
+				index[pc] = (tuple(int.from_bytes(code[i:i + 2], 'little') for i in range(0, length, 2)), text)
+				pc += length
+		except Exception as e: logging.error(f'could not disassemble segment {csr:X}: {e}')
+		self.index[csr] = index
+		self.indexing.discard(csr)
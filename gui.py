@@ -0,0 +1,1387 @@
+import os
+import sys
+import math
+import time
+import queue
+import bisect
+import pygame
+import struct
+import functools
+import threading
+import traceback
+import tkinter as tk
+import tkinter.ttk as ttk
+import tkinter.font
+import tkinter.messagebox
+import tkinter.simpledialog
+from enum import IntEnum
+
+import core
+import render
+from core import rom_info
+
+if pygame.version.vernum < (2, 2, 0):
+	print(f'This program requires at least Pygame 2.2.0. (You are running Pygame {pygame.version.ver})')
+	sys.exit()
+
+# Configuration module, set by run()
+config = None
+
+# https://github.com/JamesGKent/python-tkwidgets/blob/master/Debounce.py
+class Debounce():
+	'''
+	When holding a key down, multiple key press and key release events are fired in
+	succession. Debouncing is implemented in order to squash these repeated events
+	and know when the "real" KeyRelease and KeyPress events happen.
+	Use by subclassing a tkinter widget along with this class:
+		class DebounceTk(Debounce, tk.Tk):
+			pass
+	'''
+	
+	# use classname as key to store class bindings
+	# as single dict for all instances
+	_bind_class_dict = {}
+	
+	# 'all' bindings stored here
+	# single dict for all instances
+	_bind_all_dict = {}
+	
+	def bind(self, event, function, debounce=True):
+		'''
+		Override the bind method, acts as normal binding if not KeyPress or KeyRelease
+		type events, optional debounce parameter can be set to false to force normal behavior
+		'''
+		self._debounce_init()
+		self._debounce_bind(event, function, debounce,
+			self._binding_dict, self._base.bind)
+			
+	def bind_all(self, event, function, debounce=True):
+		'''
+		Override the bind_all method, acts as normal binding if not KeyPress or KeyRelease
+		type events, optional debounce parameter can be set to false to force normal behavior
+		'''
+		self._debounce_init()
+		self._debounce_bind(event, function, debounce,
+			self._bind_all_dict, self._base.bind_all)
+		
+	def bind_class(self, event, function, debounce=True):
+		'''
+		Override the bind_class method, acts as normal binding if not KeyPress or KeyRelease
+		type events, optional debounce parameter can be set to false to force normal behavior
+		unlike underlying tk bind_class this uses name of class on which its called
+		instead of requireing clas name as a parameter
+		'''
+		self._debounce_init()
+		self._debounce_bind(event, function, debounce,
+			self._bind_class_dict[self.__class__.__name__],
+			self._base.bind_class, self.__class__.__name__)
+			
+	def _debounce_bind(self, event, function, debounce, bind_dict, bind_method, *args):
+		'''
+		internal method to implement binding
+		'''
+		self._debounce_init()
+		# remove special symbols and split at first hyphen if present
+		ev = event.replace("<", "").replace(">", "").split('-', 1)
+		# if debounce and a supported event
+		if (('KeyPress' in ev) or ('KeyRelease' in ev)) and debounce:
+			if len(ev) == 2: # not generic binding so use keynames as key
+				evname = ev[1]
+			else: # generic binding, use event type
+				evname = ev[0]
+			if evname in bind_dict: # if have prev binding use that dict
+				d = bind_dict[evname]
+			else: # no previous binding, create new default dict
+				d = {'has_prev_key_release':None, 'has_prev_key_press':False}
+
+			# add function to dict (as keypress or release depending on name)
+			d[ev[0]] = function
+			# save binding back into dict
+			bind_dict[evname] = d
+			# call base class binding
+			if ev[0] == 'KeyPress':
+				bind_method(self, *args, sequence=event, func=self._on_key_press_repeat)
+			elif ev[0] == 'KeyRelease':
+				bind_method(self, *args, sequence=event, func=self._on_key_release_repeat)
+				
+		else: # not supported or not debounce, bind as normal
+			bind_method(self, *args, sequence=event, func=function)
+			
+	def _debounce_init(self):
+		# get first base class that isn't Debounce and save ref
+		# this will be used for underlying bind methods
+		if not hasattr(self, '_base'):
+			for base in self.__class__.__bases__:
+				if base.__name__ != 'Debounce':
+					self._base = base
+					break
+		# for instance bindings
+		if not hasattr(self, '_binding_dict'):
+			self._binding_dict = {}
+			
+		# for class bindings
+		try: # check if this class has alread had class bindings
+			cd = self._bind_class_dict[self.__class__.__name__]
+		except KeyError: # create dict to store if not
+			self._bind_class_dict[self.__class__.__name__] = {}
+			
+		# get the current bind tags
+		bindtags = list(self.bindtags())
+		# add our custom bind tag before the origional bind tag
+		index = bindtags.index(self._base.__name__)
+		bindtags.insert(index, self.__class__.__name__)
+		# save the bind tags back to the widget
+		self.bindtags(tuple(bindtags))
+			
+	def _get_evdict(self, event):
+		'''
+		internal method used to get the dictionaries that store the special binding info
+		'''
+		dicts = []
+		names = {'2':'KeyPress', '3':'KeyRelease'}
+		# loop through all applicable bindings
+		for d in [self._binding_dict, # instance binding
+			self._bind_class_dict[self.__class__.__name__], # class
+			self._bind_all_dict]: # all
+			evdict = None
+			generic = False
+			if event.type in names: # if supported event
+				evname = event.keysym
+				if evname not in d: # if no specific binding
+					generic = True
+					evname = names[event.type]
+				try:
+					evdict = d[evname]
+				except KeyError:
+					pass
+			if evdict: # found a binding
+				dicts.append((d, evdict, generic))
+		return dicts
+		
+	def _on_key_release(self, event):
+		'''
+		internal method, called by _on_key_release_repeat only when key is actually released
+		this then calls the method that was passed in to the bind method
+		'''
+		# get all binding details
+		for d, evdict, generic in self._get_evdict(event):
+			# call callback
+			res = evdict['KeyRelease'](event)
+			evdict['has_prev_key_release'] = None
+			
+			# record that key was released
+			if generic:
+				d['KeyPress'][event.keysym] = False
+			else:
+				evdict['has_prev_key_press'] = False
+			# if supposed to break propagate this up
+			if res == 'break':
+				return 'break'
+		
+	def _on_key_release_repeat(self, event):
+		'''
+		internal method, called by the 'KeyRelease' event, used to filter false events
+		'''
+		# get all binding details
+		for d, evdict, generic in self._get_evdict(event):
+			if evdict["has_prev_key_release"]:
+				# got a previous release so cancel it
+				self.after_cancel(evdict["has_prev_key_release"])
+				evdict["has_prev_key_release"] = None
+			# queue new event for key release
+			evdict["has_prev_key_release"] = self.after_idle(self._on_key_release, event)
+		
+	def _on_key_press(self, event):
+		'''
+		internal method, called by _on_key_press_repeat only when key is actually pressed
+		this then calls the method that was passed in to the bind method
+		'''
+		# get all binding details
+		for d, evdict, generic in self._get_evdict(event):
+			# call callback
+			res = evdict['KeyPress'](event)
+			# record that key was pressed
+			if generic:
+				evdict[event.keysym] = True
+			else:
+				evdict['has_prev_key_press'] = True
+			# if supposed to break propagate this up
+			if res == 'break':
+				return 'break'
+		
+	def _on_key_press_repeat(self, event):
+		'''
+		internal method, called by the 'KeyPress' event, used to filter false events
+		'''
+		# get binding details
+		for d, evdict, generic in self._get_evdict(event):
+			if not generic:
+				if evdict["has_prev_key_release"]:
+					# got a previous release so cancel it
+					self.after_cancel(evdict["has_prev_key_release"])
+					evdict["has_prev_key_release"] = None
+				else:
+					# if not pressed before (real event)
+					if evdict['has_prev_key_press'] == False:
+						self._on_key_press(event)
+			else:
+				# if not pressed before (real event)
+				if (event.keysym not in evdict) or (evdict[event.keysym] == False):
+					self._on_key_press(event)
+
+class DebounceTk(Debounce, tk.Tk): pass
+
+class Jump(tk.Toplevel):
+	def __init__(self, sim):
+		super(Jump, self).__init__()
+		self.sim = sim
+
+		self.withdraw()
+		self.geometry('250x100')
+		self.resizable(False, False)
+		self.title('Jump to address')
+		self.protocol('WM_DELETE_WINDOW', self.withdraw)
+		self.vh_reg = self.register(self.sim.validate_hex)
+		ttk.Label(self, text = 'Input new values for CSR and PC.\n(please input hex bytes)', justify = 'center').pack()
+		self.csr = tk.Frame(self); self.csr.pack(fill = 'x')
+		ttk.Label(self.csr, text = 'CSR').pack(side = 'left')
+		self.csr_entry = ttk.Entry(self.csr, validate = 'key', validatecommand = (self.vh_reg, '%S', '%P', '%d', range(0x10))); self.csr_entry.pack(side = 'right')
+		self.csr_entry.insert(0, '0')
+		self.pc = tk.Frame(self); self.pc.pack(fill = 'x')
+		ttk.Label(self.pc, text = 'PC').pack(side = 'left')
+		self.pc_entry = ttk.Entry(self.pc, validate = 'key', validatecommand = (self.vh_reg, '%S', '%P', '%d', range(0, 0xfffe, 2))); self.pc_entry.pack(side = 'right')
+		ttk.Button(self, text = 'OK', command = self.set_csr_pc).pack(side = 'bottom')
+		self.bind('<Return>', lambda x: self.set_csr_pc())
+		self.bind('<Escape>', lambda x: self.withdraw())
+
+	def set_csr_pc(self):
+		csr_entry = self.csr_entry.get()
+		pc_entry = self.pc_entry.get()
+		self.sim.post(self.sim.set_csr_pc, int(csr_entry, 16) if csr_entry else 0, int(pc_entry, 16) if pc_entry else 0)
+		self.withdraw()
+
+		self.csr_entry.delete(0, 'end'); self.csr_entry.insert(0, '0')
+		self.pc_entry.delete(0, 'end')
+
+class Brkpoint(tk.Toplevel):
+	def __init__(self, sim):
+		super(Brkpoint, self).__init__()
+		self.sim = sim
+		self.shown = ()
+
+		self.withdraw()
+		self.geometry('450x350')
+		self.resizable(False, False)
+		self.title('Breakpoints')
+		self.protocol('WM_DELETE_WINDOW', self.withdraw)
+		self.vh_reg = self.register(self.sim.validate_hex)
+		ttk.Label(self, text = 'Single-step mode will be activated if CSR:PC matches a breakpoint\nand its condition (if any) is true. (please input hex bytes)\nConditions can use register names, R0-R15, ER0-ER14 and mem(addr, num_bytes).', justify = 'center').pack()
+
+		self.tree = ttk.Treeview(self, columns = ('addr', 'condition', 'hits', 'enabled'), show = 'headings', height = 8, selectmode = 'browse')
+		for col, text, width in (('addr', 'CSR:PC', 80), ('condition', 'Condition', 220), ('hits', 'Hits', 60), ('enabled', 'Enabled', 60)):
+			self.tree.heading(col, text = text)
+			self.tree.column(col, width = width, anchor = 'w' if col == 'condition' else 'center')
+		self.tree.pack(fill = 'x')
+		self.tree.bind('<Double-1>', lambda x: self.toggle_brkpoint())
+
+		self.buttons = tk.Frame(self); self.buttons.pack(fill = 'x')
+		ttk.Button(self.buttons, text = 'Enable/disable', command = self.toggle_brkpoint).pack(side = 'left')
+		ttk.Button(self.buttons, text = 'Remove', command = self.remove_brkpoint).pack(side = 'left')
+		ttk.Button(self.buttons, text = 'Remove all', command = self.clear_brkpoint).pack(side = 'left')
+
+		self.csr = tk.Frame(self); self.csr.pack(fill = 'x')
+		ttk.Label(self.csr, text = 'CSR').pack(side = 'left')
+		self.csr_entry = ttk.Entry(self.csr, validate = 'key', validatecommand = (self.vh_reg, '%S', '%P', '%d', range(0x10))); self.csr_entry.pack(side = 'right')
+		self.csr_entry.insert(0, '0')
+		self.pc = tk.Frame(self); self.pc.pack(fill = 'x')
+		ttk.Label(self.pc, text = 'PC').pack(side = 'left')
+		self.pc_entry = ttk.Entry(self.pc, validate = 'key', validatecommand = (self.vh_reg, '%S', '%P', '%d', range(0, 0xfffe, 2))); self.pc_entry.pack(side = 'right')
+		self.cond = tk.Frame(self); self.cond.pack(fill = 'x')
+		ttk.Label(self.cond, text = 'Condition (optional)').pack(side = 'left')
+		self.cond_entry = ttk.Entry(self.cond); self.cond_entry.pack(side = 'right')
+		ttk.Button(self, text = 'Add', command = self.set_brkpoint).pack(side = 'bottom')
+		self.bind('<Return>', lambda x: self.set_brkpoint())
+		self.bind('<Escape>', lambda x: self.withdraw())
+
+	def open(self):
+		self.refresh()
+		self.deiconify()
+
+	def refresh(self):
+		'''
+		Rebuilds the list from the breakpoints in the latest snapshot. Sim.pygame_loop calls
+		this whenever they change while the window is open.
+		'''
+		self.shown = self.sim.snapshot.breakpoints
+		self.tree.delete(*self.tree.get_children())
+		for addr, condition, enabled, hits in self.shown:
+			self.tree.insert('', 'end', iid = str(addr), values = (f'{addr >> 16:X}:{addr & 0xffff:04X}H', condition or '', hits, 'Yes' if enabled else 'No'))
+
+	def selected(self):
+		sel = self.tree.selection()
+		return int(sel[0]) if sel else None
+
+	def set_brkpoint(self):
+		csr_entry = self.csr_entry.get()
+		pc_entry = self.pc_entry.get()
+		condition = self.cond_entry.get().strip() or None
+		if condition is not None:
+			try: compile(condition, '<breakpoint condition>', 'eval')
+			except SyntaxError as e:
+				tk.messagebox.showerror('Error', f'Invalid condition: {e}')
+				return
+
+		addr = ((int(csr_entry, 16) if csr_entry else 0) << 16) + (int(pc_entry, 16) if pc_entry else 0)
+		self.sim.post(self.sim.breakpoints.add, addr, condition)
+
+		self.csr_entry.delete(0, 'end'); self.csr_entry.insert(0, '0')
+		self.pc_entry.delete(0, 'end')
+		self.cond_entry.delete(0, 'end')
+
+	def toggle_brkpoint(self):
+		addr = self.selected()
+		enabled = {bp[0]: bp[2] for bp in self.sim.snapshot.breakpoints}.get(addr)
+		if enabled is None: return
+		self.sim.post(self.sim.breakpoints.set_enabled, addr, not enabled)
+
+	def remove_brkpoint(self):
+		addr = self.selected()
+		if addr is None: return
+		self.sim.post(self.sim.breakpoints.remove, addr)
+
+	def clear_brkpoint(self):
+		self.sim.post(self.sim.breakpoints.clear)
+
+class Watch(tk.Toplevel):
+	def __init__(self, sim):
+		super(Watch, self).__init__()
+		self.sim = sim
+		self.shown = ()
+
+		self.withdraw()
+		self.geometry('450x330')
+		self.resizable(False, False)
+		self.title('Watchpoints')
+		self.protocol('WM_DELETE_WINDOW', self.withdraw)
+		self.vh_reg = self.register(self.sim.validate_hex)
+		ttk.Label(self, text = 'Single-step mode will be activated if data memory in a watched\nrange changes (or changes to the given value).\n(please input hex bytes)', justify = 'center').pack()
+
+		self.tree = ttk.Treeview(self, columns = ('range', 'value', 'hits'), show = 'headings', height = 8, selectmode = 'browse')
+		for col, text, width in (('range', 'Range', 160), ('value', 'Value', 200), ('hits', 'Hits', 60)):
+			self.tree.heading(col, text = text)
+			self.tree.column(col, width = width, anchor = 'center')
+		self.tree.pack(fill = 'x')
+
+		self.buttons = tk.Frame(self); self.buttons.pack(fill = 'x')
+		ttk.Button(self.buttons, text = 'Remove', command = self.remove_watch).pack(side = 'left')
+		ttk.Button(self.buttons, text = 'Remove all', command = self.clear_watch).pack(side = 'left')
+
+		self.adr = tk.Frame(self); self.adr.pack(fill = 'x')
+		ttk.Label(self.adr, text = 'Address (8000 - FFFF)').pack(side = 'left')
+		self.adr_entry = ttk.Entry(self.adr, validate = 'key', validatecommand = (self.vh_reg, '%S', '%P', '%d', range(0x8000, 0x10000))); self.adr_entry.pack(side = 'right')
+		self.len = tk.Frame(self); self.len.pack(fill = 'x')
+		ttk.Label(self.len, text = 'Length').pack(side = 'left')
+		self.len_entry = ttk.Entry(self.len, validate = 'key', validatecommand = (self.vh_reg, '%S', '%P', '%d', range(1, 0x8001))); self.len_entry.pack(side = 'right')
+		self.len_entry.insert(0, '1')
+		self.val = tk.Frame(self); self.val.pack(fill = 'x')
+		ttk.Label(self.val, text = 'Hex value (optional)').pack(side = 'left')
+		self.val_entry = ttk.Entry(self.val, validate = 'key', validatecommand = (self.vh_reg, '%S', '%P', '%d', None, 1)); self.val_entry.pack(side = 'right')
+		ttk.Button(self, text = 'Add', command = self.add_watch).pack(side = 'bottom')
+		self.bind('<Return>', lambda x: self.add_watch())
+		self.bind('<Escape>', lambda x: self.withdraw())
+
+	def open(self):
+		self.refresh()
+		self.deiconify()
+
+	def refresh(self):
+		self.shown = self.sim.snapshot.watchpoints
+		self.tree.delete(*self.tree.get_children())
+		for (addr, length), value, hits in self.shown:
+			self.tree.insert('', 'end', iid = f'{addr}:{length}', values = (f'00:{addr:04X}H - 00:{addr + length - 1:04X}H', value.hex(' ').upper() if value is not None else 'Any change', hits))
+
+	def add_watch(self):
+		adr = self.adr_entry.get(); adr = int(adr, 16) if adr else 0x8000
+		length = self.len_entry.get(); length = int(length, 16) if length else 1
+		val = self.val_entry.get()
+		try: val = bytes.fromhex(val) if val.strip() else None
+		except ValueError:
+			tk.messagebox.showerror('Error', 'Invalid hex string!')
+			return
+		if adr < 0x8000 or adr + length > 0x10000 or length < 1:
+			tk.messagebox.showerror('Error', 'The range has to be inside 00:8000H - 00:FFFFH!')
+			return
+		if val is not None and len(val) != length:
+			tk.messagebox.showerror('Error', 'The value has to be as long as the range!')
+			return
+
+		self.sim.post(self.sim.watchpoints.add, self.sim.dmem, adr, length, val)
+
+		self.adr_entry.delete(0, 'end')
+		self.len_entry.delete(0, 'end'); self.len_entry.insert(0, '1')
+		self.val_entry.delete(0, 'end')
+
+	def remove_watch(self):
+		sel = self.tree.selection()
+		if not sel: return
+		self.sim.post(self.sim.watchpoints.remove, self.sim.dmem, tuple(int(i) for i in sel[0].split(':')))
+
+	def clear_watch(self):
+		self.sim.post(self.sim.watchpoints.clear)
+
+class Write(tk.Toplevel):
+	def __init__(self, sim):
+		super(Write, self).__init__()
+		self.sim = sim
+		
+		tk_font = tk.font.nametofont('TkDefaultFont')
+		bold_italic_font = tk_font.copy()
+		bold_italic_font.config(weight = 'bold', slant = 'italic')
+
+		self.withdraw()
+		self.geometry('375x125')
+		self.resizable(False, False)
+		self.title('Write to data memory')
+		self.protocol('WM_DELETE_WINDOW', self.withdraw)
+		self.vh_reg = self.register(self.sim.validate_hex)
+		ttk.Label(self, text = '(please input hex bytes)', justify = 'center').pack()
+		self.csr = tk.Frame(self); self.csr.pack(fill = 'x')
+		ttk.Label(self.csr, text = 'Segment').pack(side = 'left')
+		self.csr_entry = ttk.Entry(self.csr, validate = 'key', validatecommand = (self.vh_reg, '%S', '%P', '%d', range(0x100))); self.csr_entry.pack(side = 'right')
+		self.csr_entry.insert(0, '0')
+		self.pc = tk.Frame(self); self.pc.pack(fill = 'x')
+		ttk.Label(self.pc, text = 'Address').pack(side = 'left')
+		self.pc_entry = ttk.Entry(self.pc, validate = 'key', validatecommand = (self.vh_reg, '%S', '%P', '%d', range(0x10000))); self.pc_entry.pack(side = 'right')
+		self.byte = tk.Frame(self); self.byte.pack(fill = 'x')
+		ttk.Label(self.byte, text = 'Hex data').pack(side = 'left')
+		self.byte_entry = ttk.Entry(self.byte, validate = 'key', validatecommand = (self.vh_reg, '%S', '%P', '%d', None, 1)); self.byte_entry.pack(side = 'right')
+		ttk.Button(self, text = 'OK', command = self.write).pack(side = 'bottom')
+		self.bind('<Return>', lambda x: self.write())
+		self.bind('<Escape>', lambda x: self.withdraw())
+
+	def write(self):
+		seg = self.csr_entry.get(); seg = int(seg, 16) if seg else 0
+		adr = self.pc_entry.get(); adr = int(adr, 16) if adr else 0
+		byte = self.byte_entry.get()
+		try: byte = bytes.fromhex(byte) if byte else b'\x00'
+		except Exception: 
+			tk.messagebox.showerror('Error', 'Invalid hex string!')
+			return
+		
+		self.sim.post(self.sim.write_dmem_bytes, adr, byte, seg)
+		self.withdraw()
+
+		self.csr_entry.delete(0, 'end'); self.csr_entry.insert(0, '0')
+		self.pc_entry.delete(0, 'end')
+		self.byte_entry.delete(0, 'end'); self.byte_entry.insert(0, '0')
+
+class DataMem(tk.Toplevel):
+	RANGES = {
+		'RAM (00:8000H - 00:EFFFH)': (0, 0x8000, 0xf000),
+		'SFRs (00:F000H - 00:FFFFH)': (0, 0xf000, 0x10000),
+		'Data memory (00:8000H - 00:FFFFH)': (0, 0x8000, 0x10000),
+	}
+
+	def __init__(self, sim):
+		super(DataMem, self).__init__()
+		self.sim = sim
+
+		self.withdraw()
+		self.geometry(f'{config.data_mem_width}x{config.data_mem_height}')
+		self.resizable(False, False)
+		self.title('Show data memory')
+		self.protocol('WM_DELETE_WINDOW', self.withdraw)
+		self.vh_reg = self.register(self.sim.validate_hex)
+
+		self.top_frame = tk.Frame(self); self.top_frame.pack(fill = 'x')
+		self.segment_var = tk.StringVar(); self.segment_var.set('RAM (00:8000H - 00:EFFFH)')
+		self.segment_cb = ttk.Combobox(self.top_frame, width = 32, textvariable = self.segment_var, values = list(self.RANGES), state = 'readonly')
+		self.segment_cb.bind('<<ComboboxSelected>>', lambda x: self.set_range(*self.RANGES[self.segment_var.get()]))
+		self.segment_cb.pack(side = 'left')
+		ttk.Button(self.top_frame, text = 'Go', command = self.set_custom_range).pack(side = 'right')
+		self.end_entry = ttk.Entry(self.top_frame, width = 5, validate = 'key', validatecommand = (self.vh_reg, '%S', '%P', '%d', range(0x10001))); self.end_entry.pack(side = 'right')
+		ttk.Label(self.top_frame, text = '-').pack(side = 'right')
+		self.start_entry = ttk.Entry(self.top_frame, width = 5, validate = 'key', validatecommand = (self.vh_reg, '%S', '%P', '%d', range(0x10000))); self.start_entry.pack(side = 'right')
+		ttk.Label(self.top_frame, text = ':').pack(side = 'right')
+		self.seg_entry = ttk.Entry(self.top_frame, width = 3, validate = 'key', validatecommand = (self.vh_reg, '%S', '%P', '%d', range(0x100))); self.seg_entry.pack(side = 'right')
+		ttk.Label(self.top_frame, text = 'Range').pack(side = 'right')
+
+		self.code_frame = ttk.Frame(self)
+		self.code_text_sb = ttk.Scrollbar(self.code_frame, command = self.sb_yview)
+		self.code_text_sb.pack(side = 'right', fill = 'y')
+		self.rows = (config.data_mem_height - 30) // tk.font.Font(font = config.data_mem_font).metrics('linespace')
+		self.code_text = tk.Text(self.code_frame, font = config.data_mem_font, height = self.rows, wrap = 'none', state = 'disabled')
+		self.code_text.tag_configure('changed', foreground = '#d00000')
+		self.code_text.pack(fill = 'both', expand = True)
+		self.code_frame.pack(fill = 'both', expand = True)
+
+		self.code_text.bind('<MouseWheel>', lambda x: self.scroll(-1 if x.delta > 0 else 1, 'units', 3))
+		self.code_text.bind('<Button-4>', lambda x: self.scroll(-1, 'units', 3))
+		self.code_text.bind('<Button-5>', lambda x: self.scroll(1, 'units', 3))
+
+		self.segment = 0
+		self.start = 0x8000
+		self.end = 0xf000
+		self.top = 0
+		# Address and bytes of each displayed row, to diff the next refresh against
+		self.shown = []
+		self.fetched_seq = None
+
+	def open(self):
+		self.get_mem(True)
+		self.deiconify()
+
+	def set_range(self, segment, start, end):
+		self.segment, self.start, self.end = segment, start, end
+		self.top = 0
+		self.shown = []
+		self.code_text['state'] = 'normal'
+		self.code_text.delete('1.0', 'end')
+		self.code_text['state'] = 'disabled'
+		self.get_mem(True)
+
+	def set_custom_range(self):
+		seg = self.seg_entry.get(); seg = int(seg, 16) if seg else 0
+		start = self.start_entry.get(); start = int(start, 16) if start else 0
+		end = self.end_entry.get(); end = int(end, 16) if end else 0x10000
+		if end <= start:
+			tk.messagebox.showerror('Error', 'The end address has to be after the start address!')
+			return
+		self.segment_var.set(f'{seg:02X}:{start:04X}H - {seg:02X}:{end - 1:04X}H')
+		self.set_range(seg, start & 0xfff0, end)
+
+	def sb_yview(self, *args):
+		if args[0] == 'moveto':
+			self.top = int(float(args[1]) * self.total_rows())
+			self.get_mem(True)
+		elif args[0] == 'scroll': self.scroll(int(args[1]), args[2])
+
+	def scroll(self, num, what, units = 1):
+		self.top += num * (self.rows - 1 if what == 'pages' else units)
+		self.get_mem(True)
+
+	def total_rows(self): return (self.end - self.start + 15) // 16
+
+	def get_mem(self, force = False):
+		'''
+		Refreshes the visible rows only. Data memory at 00:8000H - 00:FFFFH comes from the
+		current snapshot; anything else is read on the emulation thread, once per snapshot
+		(the snapshot published after a read doesn't cause another one) unless `force`d.
+		'''
+		total = self.total_rows()
+		self.top = max(min(self.top, total - self.rows), 0)
+		addr = self.start + self.top * 16
+		num_bytes = min(self.rows * 16, self.end - addr)
+
+		if self.segment == 0 and addr >= 0x8000:
+			dmem = self.sim.snapshot.dmem
+			self.show(addr, dmem[addr - 0x8000:addr - 0x8000 + num_bytes])
+		elif force or self.sim.snapshot.seq != self.fetched_seq: self.sim.post(self.fetch, self.segment, addr, num_bytes)
+
+		if total: self.code_text_sb.set(self.top / total, min(self.top + self.rows, total) / total)
+
+	def fetch(self, segment, addr, num_bytes):
+		# Emulation thread
+		data = self.sim.read_dmem_bytes(addr, num_bytes, segment)
+		self.sim.gui_call(self.show, addr, data, segment, self.sim.snapshot_seq + 1)
+
+	def show(self, addr, data, segment = 0, seq = None):
+		'''
+		Updates only the lines that differ from what is displayed, and highlights the bytes
+		that changed since the last refresh.
+		'''
+		if segment != self.segment: return
+		if seq is not None: self.fetched_seq = seq
+		rows = [(addr + i, data[i:i+16]) for i in range(0, len(data), 16)]
+		old = dict(self.shown)
+
+		self.code_text['state'] = 'normal'
+		self.code_text.tag_remove('changed', '1.0', 'end')
+		for row, (row_addr, row_data) in enumerate(rows):
+			line = row + 1
+			if row >= len(self.shown) or self.shown[row] != (row_addr, row_data):
+				text = render.format_hex_row(segment, row_addr, row_data)
+				if row < len(self.shown): self.code_text.delete(f'{line}.0', f'{line}.end')
+				elif row: text = '\n' + text
+				self.code_text.insert(f'{line}.0' if row < len(self.shown) else 'end', text)
+
+			prev = old.get(row_addr)
+			if prev is not None and prev != row_data:
+				for i, byte in enumerate(row_data):
+					if i < len(prev) and prev[i] != byte: self.code_text.tag_add('changed', f'{line}.{9 + i*3}', f'{line}.{11 + i*3}')
+		if len(rows) < len(self.shown): self.code_text.delete(f'{len(rows)}.end', 'end')
+		self.code_text['state'] = 'disabled'
+		self.shown = rows
+
+class Disas(tk.Toplevel):
+	def __init__(self, sim):
+		super(Disas, self).__init__()
+		self.sim = sim
+
+		self.withdraw()
+		self.geometry(f'{config.data_mem_width}x{config.data_mem_height}')
+		self.resizable(False, False)
+		self.title('Show disassembly')
+		self.protocol('WM_DELETE_WINDOW', self.withdraw)
+
+		self.top_frame = tk.Frame(self); self.top_frame.pack(fill = 'x')
+		self.segment_var = tk.StringVar(); self.segment_var.set('Segment 0')
+		self.segment_cb = ttk.Combobox(self.top_frame, width = 15, textvariable = self.segment_var, values = [f'Segment {i:X}' for i in range(0x10)], state = 'readonly')
+		self.segment_cb.bind('<<ComboboxSelected>>', lambda x: self.load(self.segment(), 0))
+		self.segment_cb.pack(side = 'left')
+		self.follow_var = tk.BooleanVar(value = True)
+		ttk.Checkbutton(self.top_frame, text = 'Follow CSR:PC', variable = self.follow_var, command = self.update_pc).pack(side = 'left')
+		ttk.Label(self.top_frame, text = 'Double-click: toggle breakpoint').pack(side = 'right')
+
+		self.code_frame = ttk.Frame(self)
+		self.code_text_sb = ttk.Scrollbar(self.code_frame, command = self.sb_yview)
+		self.code_text_sb.pack(side = 'right', fill = 'y')
+		self.rows = (config.data_mem_height - 30) // tk.font.Font(font = config.data_mem_font).metrics('linespace')
+		self.code_text = tk.Text(self.code_frame, font = config.data_mem_font, height = self.rows, wrap = 'none', state = 'disabled')
+		self.code_text.tag_configure('pc', background = '#c0d8ff')
+		self.code_text.tag_configure('bp', foreground = '#d00000')
+		self.code_text.pack(fill = 'both', expand = True)
+		self.code_frame.pack(fill = 'both', expand = True)
+
+		self.code_text.bind('<MouseWheel>', lambda x: self.scroll(-1 if x.delta > 0 else 1, 'units', 3))
+		self.code_text.bind('<Button-4>', lambda x: self.scroll(-1, 'units', 3))
+		self.code_text.bind('<Button-5>', lambda x: self.scroll(1, 'units', 3))
+		self.code_text.bind('<Double-1>', self.toggle_brkpoint)
+
+		self.csr = None
+		self.entries = {}
+		self.pcs = []
+		self.top = 0
+		self.pc_row = None
+
+	def segment(self): return int(self.segment_var.get().split()[1], 16)
+
+	def open(self):
+		self.deiconify()
+		regs = self.sim.snapshot.regs
+		self.load(regs['CSR'] if self.follow_var.get() else self.segment())
+
+	def load(self, csr, top = None):
+		'''
+		Shows code segment `csr`. The listing follows the instruction boundaries found by
+		the background disassembly of the segment, which is started here if needed.
+		'''
+		self.segment_var.set(f'Segment {csr:X}')
+		index = self.sim.disassembler.index.get(csr)
+		if index is None:
+			self.csr = None
+			self.set_text(f'Disassembling segment {csr:X}...')
+			self.sim.post(self.sim.index_segment, csr)
+			self.after(100, lambda: self.load(csr, top) if self.winfo_viewable() and self.segment() == csr else None)
+			return
+
+		if csr != self.csr:
+			self.csr = csr
+			self.entries = index
+			self.pcs = list(index)
+		if top is not None: self.top = top
+		self.render()
+		self.update_pc()
+
+	def set_text(self, text):
+		self.code_text['state'] = 'normal'
+		self.code_text.delete('1.0', 'end')
+		self.code_text.insert('end', text)
+		self.code_text['state'] = 'disabled'
+
+	def render(self):
+		'''
+		Renders only the rows that are visible.
+		'''
+		self.top = max(min(self.top, len(self.pcs) - self.rows), 0)
+		pcs = self.pcs[self.top:self.top + self.rows]
+		bps = {bp[0] for bp in self.sim.snapshot.breakpoints}
+		lines = []
+		for pc in pcs:
+			words, text = self.entries[pc]
+			lines.append(f'{"*" if (self.csr << 16) + pc in bps else " "} {self.csr:X}:{pc:04X}H  {" ".join(format(word, "04X") for word in words):<15}  {text}')
+		self.set_text('\n'.join(lines))
+		for row, pc in enumerate(pcs):
+			if (self.csr << 16) + pc in bps: self.code_text.tag_add('bp', f'{row + 1}.0', f'{row + 1}.end')
+
+		self.pc_row = None
+		if pcs: self.code_text_sb.set(self.top / len(self.pcs), (self.top + len(pcs)) / len(self.pcs))
+
+	def sb_yview(self, *args):
+		if args[0] == 'moveto': self.top = int(float(args[1]) * len(self.pcs))
+		elif args[0] == 'scroll': return self.scroll(int(args[1]), args[2])
+		if self.csr is not None: self.render(); self.update_pc()
+
+	def scroll(self, num, what, units = 1):
+		if self.csr is None: return
+		self.top += num * (self.rows - 1 if what == 'pages' else units)
+		self.render()
+		self.update_pc()
+
+	def update_pc(self):
+		'''
+		Moves the CSR:PC highlight. The listing is only re-rendered when following CSR:PC
+		and it has left the visible rows.
+		'''
+		if self.csr is None: return
+		regs = self.sim.snapshot.regs
+		csr, pc = regs['CSR'], regs['PC']
+		follow = self.follow_var.get()
+		if csr != self.csr:
+			if follow: self.load(csr)
+			return
+
+		row = bisect.bisect_right(self.pcs, pc) - 1
+		if follow and not self.top <= row < self.top + self.rows:
+			self.top = max(row - self.rows // 3, 0)
+			self.render()
+
+		if self.pc_row is not None: self.code_text.tag_remove('pc', f'{self.pc_row}.0', f'{self.pc_row}.end')
+		self.pc_row = row - self.top + 1 if self.top <= row < self.top + self.rows else None
+		if self.pc_row is not None: self.code_text.tag_add('pc', f'{self.pc_row}.0', f'{self.pc_row}.end')
+
+	def toggle_brkpoint(self, event):
+		if self.csr is None: return 'break'
+		row = self.top + int(self.code_text.index(f'@{event.x},{event.y}').split('.')[0]) - 1
+		if row < len(self.pcs):
+			addr = (self.csr << 16) + self.pcs[row]
+			if addr in {bp[0] for bp in self.sim.snapshot.breakpoints}: self.sim.post(self.sim.breakpoints.remove, addr)
+			else: self.sim.post(self.sim.breakpoints.add, addr)
+			self.sim.post(self.sim.gui_call, self.render)
+			self.sim.post(self.sim.gui_call, self.update_pc)
+		return 'break'
+
+class StatsWin(tk.Toplevel):
+	def __init__(self, sim):
+		super(StatsWin, self).__init__()
+		self.sim = sim
+
+		self.withdraw()
+		self.geometry(f'{config.data_mem_width}x{config.data_mem_height // 2}')
+		self.title('Statistics')
+		self.protocol('WM_DELETE_WINDOW', self.withdraw)
+
+		self.buttons = tk.Frame(self); self.buttons.pack(fill = 'x')
+		ttk.Checkbutton(self.buttons, text = 'Collect statistics', variable = self.sim.stats_var).pack(side = 'left')
+		ttk.Button(self.buttons, text = 'Reset', command = lambda: self.sim.post(self.sim.stats.reset)).pack(side = 'left')
+		ttk.Button(self.buttons, text = f'Write {config.stats_path}', command = lambda: self.sim.stats.dump(config.stats_path)).pack(side = 'left')
+		self.text = tk.Text(self, font = config.data_mem_font, wrap = 'none', state = 'disabled')
+		self.text.pack(fill = 'both', expand = True)
+		self.next_refresh = 0
+
+	def open(self):
+		self.refresh()
+		self.deiconify()
+
+	def refresh(self):
+		self.next_refresh = time.perf_counter() + 0.5
+		self.text['state'] = 'normal'
+		self.text.delete('1.0', 'end')
+		self.text.insert('end', self.sim.stats.text() if self.sim.stats.enabled or self.sim.stats.hist else 'Statistics are disabled.')
+		self.text['state'] = 'disabled'
+
+class RegsPanel(tk.Frame):
+	'''
+	Register display. Every field is a label of its own, which is only reformatted and
+	redrawn when its value changes (see render.Fields). Registers that changed in the last
+	update are highlighted.
+	'''
+	CONTROL = ('CSR:PC', 'Prev. CSR:PC', 'Words @ CSR:PC', 'Instruction', 'SP', 'Words @ SP', 'DSR:EA', None, 'PSW', None, 'LCSR:LR', 'ECSR1:ELR1', 'ECSR2:ELR2', 'ECSR3:ELR3', None, 'EPSW1', 'EPSW2', 'EPSW3')
+	OTHER = ('Breakpoints', 'Watchpoints', 'Save state', 'Rewind', 'STOP mode acceptor', 'STOP mode', 'Emulated ticks', 'Execution mode', 'Speed limit', 'LCD draw time', 'Frame time')
+
+	def __init__(self, sim, master):
+		super(RegsPanel, self).__init__(master, bg = config.console_bg)
+		self.sim = sim
+		self.regs = render.Fields(dict(render.REG_FORMATS, Instruction = lambda value: sim.disassemble(*value)), render.format_byte)
+		self.other = render.Fields()
+		self.labels = {}
+		self.highlighted = []
+		self.enabled = True
+		self.next_update = 0
+
+		self.fields = tk.Frame(self, bg = config.console_bg)
+		self.fields.pack(fill = 'both', expand = True)
+		self.disabled = self.label(self, '=== REGISTER DISPLAY DISABLED ===\nTo enable, do one of these things:\n- Enable single-step.\n- Press R or right-click >\n  Show registers outside of single-step.')
+
+		self.label(self.fields, '=== REGISTERS ===\n\nGeneral registers:').pack(anchor = 'w')
+		gr = tk.Frame(self.fields, bg = config.console_bg); gr.pack(anchor = 'w')
+		for i in range(16):
+			self.label(gr, f'R{i}', width = 5).grid(row = i // 8 * 2, column = i % 8, sticky = 'w')
+			self.labels[f'R{i}'] = self.label(gr, width = 5)
+			self.labels[f'R{i}'].grid(row = i // 8 * 2 + 1, column = i % 8, sticky = 'w')
+
+		self.label(self.fields, '\nControl registers:').pack(anchor = 'w')
+		self.add_rows(self.CONTROL, 16)
+		self.label(self.fields, '\nOther information:').pack(anchor = 'w')
+		self.add_rows(self.OTHER, 25)
+
+	@staticmethod
+	def label(master, text = '', **kwargs): return tk.Label(master, text = text, font = config.console_font, fg = config.console_fg, bg = config.console_bg, justify = 'left', anchor = 'w', bd = 0, padx = 0, pady = 0, **kwargs)
+
+	def add_rows(self, names, width):
+		frame = tk.Frame(self.fields, bg = config.console_bg); frame.pack(anchor = 'w')
+		row = 0
+		for name in names:
+			if name is None:
+				self.label(frame).grid(row = row, column = 0)
+				row += 1
+				continue
+			if name == 'PSW':
+				self.label(frame, '   C Z S OV MIE HC ELEVEL').grid(row = row, column = 1, sticky = 'w')
+				row += 1
+			self.label(frame, name, width = width).grid(row = row, column = 0, sticky = 'nw')
+			self.labels[name] = self.label(frame)
+			self.labels[name].grid(row = row, column = 1, sticky = 'w')
+			row += 1
+
+	def set_enabled(self, enabled):
+		if enabled == self.enabled: return
+		self.enabled = enabled
+		if enabled:
+			self.disabled.pack_forget()
+			self.fields.pack(fill = 'both', expand = True)
+		else:
+			self.fields.pack_forget()
+			self.disabled.pack(anchor = 'nw')
+
+	def refresh(self, snap, other):
+		for name in self.highlighted: self.labels[name]['fg'] = config.console_fg
+		first = not self.regs.values
+		changed = self.regs.update(render.reg_values(snap))
+		for name, text in changed:
+			label = self.labels[name]
+			label['text'] = text
+			if not first: label['fg'] = config.console_changed_fg
+		self.highlighted = [] if first else [name for name, _ in changed]
+		for name, text in self.other.update(other): self.labels[name]['text'] = text
+
+class Sim(core.Core):
+	def __init__(self):
+		self.root = DebounceTk()
+		self.root.geometry(f'{config.width*2}x{config.height}')
+		self.root.resizable(False, False)
+		self.root.title(config.root_w_name)
+		self.root.focus_set()
+		self.root['bg'] = config.console_bg
+
+		super().__init__(config)
+
+		self.keys = []
+		for key in [i[1:] for i in config.keymap.values()]: self.keys.extend(key)
+
+		self.jump = Jump(self)
+		self.brkpoint = Brkpoint(self)
+		self.watch = Watch(self)
+		self.write = Write(self)
+		self.data_mem = DataMem(self)
+		self.disas = Disas(self)
+		self.stats_var = tk.BooleanVar(value = config.stats_enabled)
+		self.stats_var.trace_add('write', lambda *x: self.post(self.set_stats, self.stats_var.get()))
+		self.stats_win = StatsWin(self)
+
+		embed_pygame = tk.Frame(self.root, width = config.width, height = config.height)
+		embed_pygame.pack(side = 'left')
+		embed_pygame.focus_set()
+
+		def press_cb(event):
+			for k, v in config.keymap.items():
+				p = v[0]
+				if (event.type == tk.EventType.ButtonPress and event.x in range(p[0], p[0]+p[2]) and event.y in range(p[1], p[1]+p[3])) \
+				or (event.type == tk.EventType.KeyPress and event.keysym.lower() in v[1:]):
+					if k is None: self.reset_core(False)
+					else: self.post(self.press_key, k)
+
+		def release_cb(event): self.post(self.release_keys)
+
+		embed_pygame.bind('<KeyPress>', press_cb)
+		embed_pygame.bind('<KeyRelease>', release_cb)
+		embed_pygame.bind('<ButtonPress-1>', press_cb)
+		embed_pygame.bind('<ButtonRelease-1>', release_cb)
+
+		if os.name != 'nt': self.root.update()
+
+		self.regs_panel = RegsPanel(self, self.root)
+		self.regs_panel.pack(side = 'left', fill = 'both', expand = True)
+
+		os.environ['SDL_WINDOWID'] = str(embed_pygame.winfo_id())
+		os.environ['SDL_VIDEODRIVER'] = 'windib' if os.name == 'nt' else 'x11'
+		pygame.init()
+		self.screen = pygame.display.set_mode()
+
+		# Bitmaps are converted to the display format once, so blitting them is a plain copy.
+		self.interface = pygame.image.load(config.interface_path).convert()
+		self.interface_rect = self.interface.get_rect()
+		self.status_bar = pygame.image.load(config.status_bar_path).convert()
+		self.status_bar_rect = self.status_bar.get_rect()
+		self.status_bar_segments = render.status_bar_segments(self.status_bar, config.status_bar_crops, config.screen_tl_w, config.screen_tl_h)
+		self.text_cache = render.TextCache()
+
+		# Screen regions that are tracked separately for redrawing.
+		self.overlay_rect = pygame.Rect(0, 0, config.width, 66)
+		self.status_bar_area = pygame.Rect(config.screen_tl_w, config.screen_tl_h, 96*3, 12)
+		self.lcd_rect = pygame.Rect(config.screen_tl_w, config.screen_tl_h + 12, 96*3, 31*3)
+		self.frame_state = {}
+		self.full_redraw = True
+
+		self.show_regs = tk.BooleanVar(value = True)
+		self.disp_lcd = tk.BooleanVar(value = True)
+		self.precise_var = tk.BooleanVar(value = config.precise_mode)
+		self.precise_var.trace_add('write', lambda *x: self.set_precise_mode())
+		self.trace_var = tk.BooleanVar(value = False)
+		self.speed_var = tk.IntVar(value = config.speed)
+		self.speed_var.trace_add('write', lambda *x: self.post(self.set_speed, self.speed_var.get()))
+		self.trace_var.trace_add('write', lambda *x: self.set_trace())
+
+		self.rc_menu = tk.Menu(self.root, tearoff = 0)
+		self.rc_menu.add_command(label = 'Step (single-step only)', accelerator = '\\', command = self.set_step)
+		self.rc_menu.add_command(label = 'Step back (single-step only)', accelerator = '[', command = lambda: self.post(self.rewind, 1))
+		self.rc_menu.add_command(label = 'Rewind...', command = self.ask_rewind)
+		self.rc_menu.add_separator()
+		self.rc_menu.add_command(label = 'Enable single-step mode', accelerator = 'S', command = lambda: self.set_single_step(True))
+		self.rc_menu.add_command(label = 'Resume execution (unpause)', accelerator = 'P', command = lambda: self.set_single_step(False))
+		self.rc_menu.add_separator()
+		self.rc_menu.add_command(label = 'Jump to...', accelerator = 'J', command = self.jump.deiconify)
+		self.rc_menu.add_separator()
+		self.rc_menu.add_command(label = 'Breakpoints...', accelerator = 'B', command = self.brkpoint.open)
+		self.rc_menu.add_command(label = 'Remove all breakpoints', accelerator = 'N', command = self.brkpoint.clear_brkpoint)
+		self.rc_menu.add_command(label = 'Watchpoints...', accelerator = 'W', command = self.watch.open)
+		self.rc_menu.add_separator()
+		self.rc_menu.add_command(label = 'Show data memory', accelerator = 'M', command = self.data_mem.open)
+		self.rc_menu.add_command(label = 'Show disassembly', accelerator = 'A', command = self.disas.open)
+		self.rc_menu.add_command(label = 'Show statistics', accelerator = 'I', command = self.stats_win.open)
+		self.rc_menu.add_separator()
+		self.rc_menu.add_checkbutton(label = 'Show registers outside of single-step', accelerator = 'R', variable = self.show_regs)
+		self.rc_menu.add_checkbutton(label = 'Toggle LCD/buffer display (on: LCD, off: buffer)', accelerator = 'D', variable = self.disp_lcd)
+		self.rc_menu.add_checkbutton(label = 'Precise execution (one instruction at a time)', accelerator = 'X', variable = self.precise_var)
+		speed_menu = tk.Menu(self.rc_menu, tearoff = 0)
+		for speed, label in ((1, '1x (real hardware)'), (2, '2x'), (10, '10x'), (0, 'Unlimited')): speed_menu.add_radiobutton(label = label, value = speed, variable = self.speed_var)
+		self.rc_menu.add_cascade(label = 'Speed', menu = speed_menu)
+		self.rc_menu.add_checkbutton(label = f'Record instruction trace (to {config.trace_path})', accelerator = 'T', variable = self.trace_var)
+		self.rc_menu.add_separator()
+		self.rc_menu.add_command(label = 'Reset core', accelerator = 'C', command = self.reset_core)
+		self.rc_menu.add_separator()
+
+		save_menu = tk.Menu(self.rc_menu, tearoff = 0)
+		load_menu = tk.Menu(self.rc_menu, tearoff = 0)
+		for slot in range(1, config.save_slots + 1):
+			save_menu.add_command(label = f'Slot {slot}', command = lambda slot = slot: self.post(self.save_slot, slot))
+			load_menu.add_command(label = f'Slot {slot}', command = lambda slot = slot: self.post(self.load_slot, slot))
+		self.rc_menu.add_cascade(label = 'Save state', menu = save_menu)
+		self.rc_menu.add_cascade(label = 'Load state', menu = load_menu)
+		self.rc_menu.add_separator()
+
+		extra_funcs = tk.Menu(self.rc_menu, tearoff = 0)
+		extra_funcs.add_command(label = 'ROM info', command = self.calc_checksum)
+		extra_funcs.add_command(label = 'Write to data memory', command = self.write.deiconify)
+		self.rc_menu.add_cascade(label = 'Extra functions', menu = extra_funcs)
+		self.rc_menu.add_separator()
+		self.rc_menu.add_command(label = 'Quit', accelerator = 'Q', command = self.exit_sim)
+
+		self.root.bind('<Button-3>', self.open_popup)
+		self.root.bind('\\', lambda x: self.set_step())
+		self.root.bind('[', lambda x: self.post(self.rewind, 1))
+		self.bind_('s', lambda x: self.set_single_step(True))
+		self.bind_('p', lambda x: self.set_single_step(False))
+		self.bind_('j', lambda x: self.jump.deiconify())
+		self.bind_('b', lambda x: self.brkpoint.open())
+		self.bind_('n', lambda x: self.brkpoint.clear_brkpoint())
+		self.bind_('w', lambda x: self.watch.open())
+		self.bind_('m', lambda x: self.data_mem.open())
+		self.bind_('a', lambda x: self.disas.open())
+		self.bind_('i', lambda x: self.stats_win.open())
+		self.bind_('r', lambda x: self.show_regs.set(not self.show_regs.get()))
+		self.bind_('d', lambda x: self.disp_lcd.set(not self.disp_lcd.get()))
+		self.bind_('x', lambda x: self.precise_var.set(not self.precise_var.get()))
+		self.bind_('t', lambda x: self.trace_var.set(not self.trace_var.get()))
+		self.bind_('c', lambda x: self.reset_core())
+		self.bind_('q', lambda x: self.exit_sim())
+
+		self.pending = False
+		self.clock = pygame.time.Clock()
+		self.state_msg = 'None'
+		self.lcd_time = 0
+
+		self.commands = queue.Queue()
+		self.events = queue.Queue()
+		self.emu_thread = threading.Thread(target = self.emu_loop, daemon = True)
+		self.snapshot = None
+		self.snapshot_seq = 0
+		self.drawn_snapshot = None
+
+		self.loop_id = None
+		self.next_frame = 0
+		self.frame_times = {'render': 0, 'print_regs': 0, 'get_mem': 0, 'disas': 0, 'update': 0}
+
+	def run(self, state = None):
+		self.sim.coreReset()
+		if state is not None:
+			try: self.load_state(self.state_path(state) if state.isdigit() else state)
+			except ValueError as e: tk.messagebox.showerror('Error', f'Could not load the save state, starting from reset:\n{e}')
+		self.publish()
+		self.emu_thread.start()
+
+		self.next_frame = time.perf_counter()
+		self.pygame_loop()
+
+		if os.name != 'nt': os.system('xset r off')
+		self.root.mainloop()
+
+	def bind_(self, char, func):
+		self.root.bind(char.lower(), func)
+		self.root.bind(char.upper(), func)
+
+	@staticmethod
+	def validate_hex(new_char, new_str, act_code, rang = None, spaces = False):
+		act_code = int(act_code)
+		if rang: rang = eval(rang)
+		
+		if act_code == 1:
+			try: new_value_int = int(new_char, 16)
+			except ValueError:
+				if new_char != ' ': return False
+				elif not spaces: return False
+			if rang and len(new_str) >= len(hex(rang[-1])[2:]) and int(new_str, 16) not in rang: return False
+
+		return True
+
+	def calc_checksum(self):
+		# Read from the ROM file (or the cache), so it doesn't need the emulation thread
+		tk.messagebox.showinfo('ROM info', rom_info(config))
+
+	def post(self, func, *args):
+		'''
+		Queues a call to be run on the emulation thread. Everything that touches SimU8
+		goes through here; the GUI thread only reads the published snapshots.
+		'''
+		self.commands.put(functools.partial(func, *args))
+		self.pending = True
+		self.wake()
+
+	def gui_call(self, func, *args):
+		'''
+		Queues a call to be run on the GUI thread at the start of the next frame.
+		'''
+		self.events.put(functools.partial(func, *args))
+
+	def set_step(self): self.post(self.step_once)
+
+	def step_once(self):
+		if not self.single_step: return
+		self.core_step()
+		self.governor.reset()
+
+	def ask_rewind(self):
+		num = tk.simpledialog.askinteger('Rewind', f'Number of instructions to rewind (up to {len(self.journal.deltas)}):', minvalue = 1, parent = self.root)
+		if num is not None: self.post(self.rewind, num)
+
+	def rewind(self, num):
+		if not self.single_step: return
+		self.journal.rewind(num)
+		self.governor.reset()
+
+	def set_precise_mode(self): self.post(self.apply_precise_mode, self.precise_var.get())
+
+	def save_slot(self, slot):
+		path = self.state_path(slot)
+		try: self.state_msg = f'Slot {slot} saved in {self.save_state(path) * 1000:.1f} ms'
+		except Exception as e: self.gui_call(tk.messagebox.showerror, 'Error', f'Could not save {path}:\n{e}')
+
+	def load_slot(self, slot):
+		path = self.state_path(slot)
+		if not os.path.exists(path):
+			self.gui_call(tk.messagebox.showerror, 'Error', f'Slot {slot} is empty.')
+			return
+		try: self.state_msg = f'Slot {slot} loaded in {self.load_state(path) * 1000:.1f} ms'
+		except ValueError as e: self.gui_call(tk.messagebox.showerror, 'Error', f'Could not load slot {slot}:\n{e}')
+
+	def set_stats(self, val):
+		if val and not self.stats.enabled: self.stats.reset()
+		self.stats.enabled = val
+
+	def set_trace(self):
+		if self.trace_var.get(): self.post(self.start_trace, config.trace_path)
+		else: self.post(self.stop_trace)
+
+	def apply_precise_mode(self, val):
+		self.precise_mode = val
+		self.ips_start = time.perf_counter()
+		self.ips_ctr = 0
+
+	def set_single_step(self, val): self.post(self.apply_single_step, val)
+
+	def apply_single_step(self, val):
+		self.single_step = val
+		self.governor.reset()
+
+	def set_speed(self, speed): self.governor.set_speed(speed)
+
+	def hit_brkpoint(self, csr, pc):
+		super().hit_brkpoint(csr, pc)
+		bp = self.breakpoints.entries.get((csr << 16) + pc)
+		self.gui_call(tk.messagebox.showinfo, 'Breakpoint hit!', f'Breakpoint {csr:X}:{pc:04X}H has been hit!' + (f'\nHit count: {bp.hits}' if bp is not None else ''))
+
+	def hit_watchpoint(self, hits):
+		super().hit_watchpoint(hits)
+		csr, pc = self.cpu.csr.value, self.cpu.pc.value
+		self.gui_call(tk.messagebox.showinfo, 'Watchpoint hit!', f'Stopped at {csr:X}:{pc:04X}H.\n' + '\n'.join(f'00:{wp.addr:04X}H: {old.hex(" ").upper()} -> {new.hex(" ").upper()}' for wp, old, new in hits))
+
+	def open_popup(self, x):
+		try: self.rc_menu.tk_popup(x.x_root, x.y_root)
+		finally: self.rc_menu.grab_release()
+
+	def emu_loop(self):
+		'''
+		Emulation thread. While paused it blocks on the command queue; while running it
+		executes commands between bursts and publishes a snapshot once per display frame.
+		When the governor says execution is ahead of real time, it waits on the command
+		queue for that long. A None command stops the thread.
+		'''
+		next_publish = 0
+		while True:
+			while self.single_step or not self.commands.empty():
+				if not self.run_command(self.commands.get()): return
+
+			if self.stop_mode:
+				if not self.wait_stop(): return
+				self.governor.reset()
+				continue
+
+			if self.precise_mode: self.core_step()
+			else: self.core_step_burst()
+
+			now = time.perf_counter()
+			if self.single_step or now >= next_publish:
+				self.publish()
+				next_publish = now + 1 / config.refresh_rate
+
+			delay = self.governor.delay()
+			if delay:
+				try: command = self.commands.get(timeout = delay)
+				except queue.Empty: continue
+				if not self.run_command(command): return
+
+	def run_command(self, command):
+		if command is None: return False
+		command()
+		# Writes made by commands (key presses, "Write to data memory") don't count as hits
+		if self.watchpoints.entries: self.watchpoints.sync(self.dmem)
+		self.publish()
+		return True
+
+	def wait_stop(self):
+		'''
+		Fast-forwards through STOP mode. Instead of counting timer ticks one by one, the
+		thread sleeps until the timer match is due in real time (config.stop_tick_rate ticks
+		per second, times the speed multiplier) and then jumps the tick count straight to it.
+		At unlimited speed it doesn't sleep at all. A command arriving in the meantime
+		advances the ticks by the time actually slept; a key press then wakes the CPU through
+		the key interrupt.
+		'''
+		# The fast-forward writes the timer registers; record it as one step so the journal
+		# doesn't lose its history to it
+		journaled = self.journal.depth and (self.precise_mode or self.single_step)
+		if journaled: self.journal.begin()
+		remaining = self.stop_remaining()
+		if not self.governor.speed:
+			self.scheduler.advance(remaining)
+			if journaled: self.journal.end()
+			return True
+		self.publish()
+
+		rate = config.stop_tick_rate * self.governor.speed
+		start = time.perf_counter()
+		try: command = self.commands.get(timeout = remaining / rate)
+		except queue.Empty:
+			self.scheduler.advance(remaining)
+			if journaled: self.journal.end()
+			return True
+
+		self.scheduler.advance(min(int((time.perf_counter() - start) * rate), remaining - 1))
+		self.sync_timer()
+		if journaled: self.journal.end()
+		if not self.run_command(command): return False
+
+		if self.stop_mode and config.real_hardware and len(self.keys_pressed) > 0:
+			self.stop_mode = False
+			self.write_dmem(0xf014, 1, 2)
+		return True
+
+	def publish(self):
+		'''
+		Builds a new snapshot of the registers and data memory and swaps it in with a single
+		reference assignment. The GUI keeps reading the previous snapshot until it picks up
+		the new one, so neither side needs a lock.
+		'''
+		if self.stats.enabled: start = time.perf_counter_ns()
+		self.snapshot_seq += 1
+		self.snapshot = self.take_snapshot(self.snapshot_seq)
+		if self.stats.enabled: self.time_phase('publish', start)
+
+	def print_regs(self):
+		'''
+		Updates the register display: right away in single-step mode, and at most
+		config.regs_refresh_rate times per second while running.
+		'''
+		snap = self.snapshot
+		enabled = snap.single_step or self.show_regs.get()
+		self.regs_panel.set_enabled(enabled)
+		if not enabled: return
+
+		now = time.perf_counter()
+		if not snap.single_step and now < self.regs_panel.next_update: return
+		self.regs_panel.next_update = now + 1 / config.regs_refresh_rate
+		self.regs_panel.refresh(snap, self.other_info(snap))
+
+	def disassemble(self, csr, pc, code):
+		if config.disas_index and csr not in self.disassembler.index and csr not in self.disassembler.indexing: self.post(self.index_segment, csr)
+
+		if self.stats.enabled: start = time.perf_counter_ns()
+		instruction = self.disassembler.instruction(csr, pc, code)
+		if self.stats.enabled: self.time_phase('disassembly', start)
+		return instruction
+
+	def other_info(self, snap):
+		return {
+			'Breakpoints': f'{len(snap.breakpoints)} set, {sum(bp[2] for bp in snap.breakpoints)} enabled',
+			'Watchpoints': f'{len(snap.watchpoints)} set',
+			'Save state': self.state_msg,
+			'Rewind': f'{len(self.journal.deltas)} instructions, {self.journal.size / max(len(self.journal.deltas), 1):.0f} bytes each, last {self.journal.rewind_time * 1000:.2f} ms',
+			'STOP mode acceptor': f"Level 1 [{'x' if snap.stop_accept[0] else ' '}]\nLevel 2 [{'x' if snap.stop_accept[1] else ' '}]",
+			'STOP mode': f"[{'x' if snap.stop_mode else ' '}]",
+			'Emulated ticks': str(snap.ticks),
+			'Execution mode': 'Precise' if self.precise_mode else 'Burst',
+			'Speed limit': f'{self.governor.speed}x' if self.governor.speed else 'Unlimited',
+			'LCD draw time': f'{self.lcd_time * 1000:.3f} ms ({config.lcd_renderer})',
+			'Frame time': f"Render {self.frame_times['render'] * 1000:.2f} ms, registers {self.frame_times['print_regs'] * 1000:.2f} ms\nData memory {self.frame_times['get_mem'] * 1000:.2f} ms, Tk {self.frame_times['update'] * 1000:.2f} ms",
+		}
+
+	def draw_text(self, text, size, x, y, color = (255, 255, 255), font_name = None, anchor = 'center'):
+		text_surface = self.text_cache.render(str(text), int(size), color, font_name)
+		text_rect = text_surface.get_rect()
+		setattr(text_rect, anchor, (x, y))
+		self.screen.blit(text_surface, text_rect)
+
+	def draw_overlay(self, state):
+		disp_lcd, speed = state
+		self.draw_text(f'Displaying {"LCD" if disp_lcd else "buffer"}', 22, config.width // 2, 22, config.pygame_color, anchor = 'midtop')
+		if speed is not None: self.draw_text(speed, 22, config.width // 2, 44, config.pygame_color, anchor = 'midtop')
+
+	def draw_status_bar(self, sbar):
+		self.screen.blits([segment for segment, on in zip(self.status_bar_segments, render.get_scr_data(sbar)) if on], False)
+
+	def draw_lcd(self, rows):
+		'''
+		Draws the dot matrix part of the LCD. `rows` is a list of 12-byte VRAM rows.
+		'''
+		start = time.perf_counter()
+		x0, y0 = self.lcd_rect.topleft
+
+		if config.lcd_renderer == 'rects': render.draw_lcd_rects(self.screen, rows, x0, y0)
+		else: self.screen.blit(render.lcd_surface(rows), (x0, y0))
+
+		elapsed = time.perf_counter() - start
+		self.lcd_time = self.lcd_time * 0.9 + elapsed * 0.1
+		if self.stats.enabled: self.stats.add('draw_lcd', int(elapsed * 1e9))
+
+	def reset_core(self, single_step = True): self.post(self.core_reset, single_step)
+
+	def exit_sim(self):
+		self.commands.put(None)
+		self.emu_thread.join()
+		self.stop_trace()
+		if self.stats.enabled: self.stats.dump(config.stats_path)
+		self.sim.memoryFree()
+		pygame.quit()
+		self.root.quit()
+		if os.name != 'nt': os.system('xset r on')
+		sys.exit()
+
+	def pygame_loop(self):
+		self.loop_id = None
+		while not self.events.empty(): self.events.get()()
+
+		snap = self.snapshot
+		start = time.perf_counter()
+		if snap is not self.drawn_snapshot:
+			self.drawn_snapshot = snap
+			self.pending = False
+			start = self.account('print_regs', start, self.print_regs)
+			if self.data_mem.winfo_viewable(): start = self.account('get_mem', start, self.data_mem.get_mem)
+			if self.disas.winfo_viewable(): start = self.account('disas', start, self.disas.update_pc)
+			if self.brkpoint.winfo_viewable() and snap.breakpoints != self.brkpoint.shown: self.brkpoint.refresh()
+			if self.watch.winfo_viewable() and snap.watchpoints != self.watch.shown: self.watch.refresh()
+		if self.stats_win.winfo_viewable() and time.perf_counter() >= self.stats_win.next_refresh: self.stats_win.refresh()
+
+		self.clock.tick()
+
+		disp_lcd = self.disp_lcd.get()
+		vram = snap.dmem[0x7800:0x7a00] if disp_lcd else snap.dmem[0x7d0:0x950]
+		stride = 0x10 if disp_lcd else 0xc
+
+		scr_range = snap.dmem[0x7030] & 7
+		scr_mode = snap.dmem[0x7031] & 7
+		rows = scr_range if scr_range and disp_lcd else 31
+
+		# Each region is only redrawn when its state differs from the last drawn frame.
+		regions = (
+			('overlay', (disp_lcd, None if snap.single_step else f'{self.governor.percent(snap.ips or 0):.0f}% speed, {self.clock.get_fps():.0f} FPS'), self.overlay_rect, self.draw_overlay),
+			('status_bar', vram[:0xc] if (disp_lcd and scr_mode in (5, 6)) or not disp_lcd else None, self.status_bar_area, self.draw_status_bar),
+			('lcd', tuple(vram[i*stride:i*stride+0xc] for i in range(1, rows + 1)) if (disp_lcd and scr_mode == 5) or not disp_lcd else None, self.lcd_rect, self.draw_lcd),
+		)
+
+		if self.full_redraw or pygame.event.get((pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED)):
+			self.full_redraw = False
+			self.frame_state.clear()
+			self.screen.fill((0, 0, 0))
+			self.screen.blit(self.interface, self.interface_rect)
+			dirty = [self.screen.get_rect()]
+		else: dirty = []
+
+		for name, state, rect, draw in regions:
+			if name in self.frame_state and self.frame_state[name] == state: continue
+			self.frame_state[name] = state
+
+			self.screen.fill((0, 0, 0), rect)
+			self.screen.blit(self.interface, rect, rect)
+			if state is not None: draw(state)
+			dirty.append(rect)
+
+		if dirty: pygame.display.update(dirty)
+		start = self.account('render', start)
+		self.root.update()
+		self.account('update', start)
+		self.schedule_frame()
+
+	def schedule_frame(self):
+		'''
+		Schedules the next frame at a fixed display rate. While single-step mode is idle the
+		rate drops to config.idle_refresh_rate; posting a command wakes the loop up and keeps
+		it at the full rate until the resulting snapshot has been drawn.
+		'''
+		idle = self.single_step and not self.pending
+		now = time.perf_counter()
+		self.next_frame = max(self.next_frame + 1 / (config.idle_refresh_rate if idle else config.refresh_rate), now)
+		self.loop_id = self.root.after(int((self.next_frame - now) * 1000), self.pygame_loop)
+
+	def wake(self):
+		# While a frame is being drawn loop_id is None, and the frame reschedules itself
+		if self.loop_id is None: return
+		self.root.after_cancel(self.loop_id)
+		self.next_frame = time.perf_counter()
+		self.loop_id = self.root.after_idle(self.pygame_loop)
+
+	def account(self, phase, start, func = None):
+		if func is not None: func()
+		now = time.perf_counter()
+		self.frame_times[phase] = self.frame_times[phase] * 0.9 + (now - start) * 0.1
+		if self.stats.enabled: self.stats.add(phase, int((now - start) * 1e9))
+		return now
+
+def run(cfg, state = None):
+	'''
+	Entry point for the GUI. `state` is a save state slot number or file to load at startup.
+	'''
+	global config
+	config = cfg
+	sim = Sim()
+	sim.run(state)
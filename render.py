@@ -0,0 +1,158 @@
+import collections
+
+import pygame
+
+from core import PSW_t
+
+# Each VRAM byte unpacked into 8 palette indices, leftmost pixel (MSB) first.
+LCD_BITS = [bytes((byte >> i) & 1 for i in range(7, -1, -1)) for byte in range(0x100)]
+
+# (VRAM byte, bit) of each status bar segment, in the order of config.status_bar_crops
+STATUS_BAR_BITS = (
+	(0, 4),    # [S]
+	(0, 2),    # [A]
+	(1, 4),    # M
+	(1, 1),    # STO
+	(2, 6),    # RCL
+	(3, 6),    # STAT
+	(4, 7),    # CMPLX
+	(5, 6),    # MAT
+	(5, 1),    # VCT
+	(7, 5),    # [D]
+	(7, 1),    # [R]
+	(8, 4),    # [G]
+	(8, 0),    # FIX
+	(9, 5),    # SCI
+	(0xa, 6),  # Math
+	(0xa, 3),  # v
+	(0xb, 7),  # ^
+	(0xb, 4),  # Disp
+)
+
+def get_scr_data(sbar): return [sbar[byte] & (1 << bit) for byte, bit in STATUS_BAR_BITS]
+
+def lcd_surface(rows, scale = 3):
+	'''
+	Returns the dot matrix part of the LCD as a surface. `rows` is a list of 12-byte VRAM
+	rows. Unlit pixels are transparent.
+	'''
+	surface = pygame.image.frombytes(b''.join([LCD_BITS[byte] for row in rows for byte in row]), (96, len(rows)), 'P')
+	surface.set_palette_at(1, (0, 0, 0))
+	surface.set_colorkey(0)
+	return pygame.transform.scale(surface, (96*scale, len(rows)*scale))
+
+def draw_lcd_rects(dest, rows, x0, y0, scale = 3):
+	for y, row in enumerate(rows):
+		for x in range(96):
+			if row[x >> 3] & (0x80 >> (x & 7)): pygame.draw.rect(dest, (0, 0, 0), (x0 + x*scale, y0 + y*scale, scale, scale))
+
+def status_bar_segments(image, crops, x0, y0):
+	'''
+	Cuts the status bar image into one surface per segment in `crops` (config.status_bar_crops),
+	paired with the screen position to blit it at.
+	'''
+	return [(image.subsurface(pygame.Rect(crop).clip(image.get_rect())).copy(), (x0 + crop[0], y0)) for crop in crops]
+
+class TextCache:
+	'''
+	Fonts and rendered text surfaces. Fonts are loaded once per (name, size); rendered
+	text is kept in an LRU cache of `size` surfaces keyed on (text, size, color, font name),
+	so text that doesn't change from frame to frame costs one dict lookup.
+	'''
+	def __init__(self, size = 64):
+		self.fonts = {}
+		self.surfaces = collections.OrderedDict()
+		self.size = size
+
+	def font(self, name, size):
+		font = self.fonts.get((name, size))
+		if font is None: font = self.fonts[name, size] = pygame.font.SysFont(name, size)
+		return font
+
+	def render(self, text, size, color, name = None):
+		key = (text, size, color, name)
+		surface = self.surfaces.get(key)
+		if surface is not None:
+			self.surfaces.move_to_end(key)
+			return surface
+
+		surface = self.surfaces[key] = self.font(name, size).render(text, True, color)
+		if len(self.surfaces) > self.size: self.surfaces.popitem(last = False)
+		return surface
+
+def format_hex_row(segment, addr, data):
+	return f'{segment:02X}:{addr % 0x10000:04X}  ' + ''.join(f'{byte:02X} ' for byte in data).ljust(48) + '  ' + ''.join(chr(byte) if 0x20 <= byte < 0x7f else '.' for byte in data)
+
+def format_words(data):
+	return ' '.join(data[i:i + 2][::-1].hex().upper() if i + 2 <= len(data) else '----' for i in range(0, 16, 2))
+
+def format_stack(value):
+	words = format_words(value)
+	return words[:19] + '\n' + words[20:]
+
+def format_psw(value):
+	field = PSW_t(raw = value).field
+	return f'{value:02X} {field.C} {field.Z} {field.S}  {field.OV}  {field.MIE}   {field.HC} {field.ELevel:02b} ({field.ELevel})'
+
+def format_csr_pc(value): return f'{value[0]:X}:{value[1]:04X}H' if value is not None else 'None'
+
+def format_byte(value): return f'{value:02X}'
+
+# Formatters of the register fields that aren't plain bytes. The panel adds 'Instruction',
+# which needs the disassembler.
+REG_FORMATS = {
+	'CSR:PC': format_csr_pc,
+	'Prev. CSR:PC': format_csr_pc,
+	'Words @ CSR:PC': lambda value: ' '.join(format(word, '04X') for word in value),
+	'SP': lambda value: f'{value:04X}H',
+	'Words @ SP': format_stack,
+	'DSR:EA': lambda value: f'{value[0]:02X}:{value[1]:04X}H',
+	'PSW': format_psw,
+	'LCSR:LR': format_csr_pc,
+	'ECSR1:ELR1': format_csr_pc,
+	'ECSR2:ELR2': format_csr_pc,
+	'ECSR3:ELR3': format_csr_pc,
+}
+
+def reg_values(snap):
+	'''
+	Returns the value of every register panel field from a core.Snapshot, keyed by field
+	name. The values are plain ints, tuples and bytes, so comparing them is cheap.
+	'''
+	regs = snap.regs
+	gr = regs['GR']
+	sp = regs['SP']
+	values = {f'R{i}': gr[i] for i in range(16)}
+	values['CSR:PC'] = (regs['CSR'], regs['PC'])
+	values['Prev. CSR:PC'] = snap.prev_csr_pc
+	values['Words @ CSR:PC'] = snap.code
+	values['Instruction'] = (regs['CSR'], regs['PC'], snap.code)
+	values['SP'] = sp
+	values['Words @ SP'] = snap.dmem[sp - 0x8000:sp - 0x7ff0] if sp >= 0x8000 else b''
+	values['DSR:EA'] = (regs['DSR'], regs['EA'])
+	values['PSW'] = regs['PSW']
+	values['LCSR:LR'] = (regs['LCSR'], regs['LR'])
+	for i in range(1, 4): values[f'ECSR{i}:ELR{i}'] = (regs[f'ECSR{i}'], regs[f'ELR{i}'])
+	for i in range(1, 4): values[f'EPSW{i}'] = regs[f'EPSW{i}']
+	return values
+
+class Fields:
+	'''
+	Formatted text of a set of fields. update() only formats the fields whose value differs
+	from the last update, and returns those as (name, text) pairs.
+	'''
+	def __init__(self, formats = {}, default = str):
+		self.formats = formats
+		self.default = default
+		self.values = {}
+
+	def update(self, values):
+		changed = []
+		old = self.values
+		for name, value in values.items():
+			if name in old and old[name] == value: continue
+			old[name] = value
+			changed.append((name, self.formats.get(name, self.default)(value)))
+		return changed
+
+	def clear(self): self.values.clear()
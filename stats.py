@@ -0,0 +1,68 @@
+import json
+import time
+import collections
+
+class Stats:
+	'''
+	Timing and call statistics. Phases are timed with perf_counter_ns by the callers,
+	which only do so while `enabled` is set, so when disabled this costs one attribute
+	check per phase. Each phase has a histogram with fixed power-of-two buckets: bucket n
+	counts durations of 2**(n-1) to 2**n - 1 ns.
+	'''
+	BUCKETS = 40
+
+	def __init__(self, enabled = False):
+		self.enabled = enabled
+		self.reset()
+
+	def reset(self):
+		self.hist = {}
+		self.total = collections.Counter()
+		self.calls = collections.Counter()
+		self.start = time.perf_counter()
+
+	def add(self, phase, ns):
+		hist = self.hist.get(phase)
+		if hist is None: hist = self.hist[phase] = [0] * self.BUCKETS
+		hist[min(ns.bit_length(), self.BUCKETS - 1)] += 1
+		self.total[phase] += ns
+
+	def count(self, name, num = 1): self.calls[name] += num
+
+	@staticmethod
+	def percentile(hist, frac):
+		'''
+		Returns the upper bound in ns of the bucket containing the `frac` percentile.
+		'''
+		target = sum(hist) * frac
+		seen = 0
+		for bucket, num in enumerate(hist):
+			seen += num
+			if seen >= target: return (1 << bucket) - 1
+		return 0
+
+	def summary(self):
+		phases = {}
+		for phase, hist in list(self.hist.items()):
+			num = sum(hist)
+			phases[phase] = {
+				'count': num,
+				'total_ms': self.total[phase] / 1e6,
+				'mean_us': self.total[phase] / num / 1e3 if num else 0,
+				'p50_us': self.percentile(hist, 0.5) / 1e3,
+				'p99_us': self.percentile(hist, 0.99) / 1e3,
+				'histogram': hist,
+			}
+		return {'elapsed_s': time.perf_counter() - self.start, 'phases': phases, 'calls': dict(self.calls)}
+
+	def text(self):
+		summary = self.summary()
+		lines = [f'Elapsed {summary["elapsed_s"]:.1f} s', '', f'{"Phase":<16}{"Count":>10}{"Total ms":>11}{"Mean us":>10}{"p50 us":>10}{"p99 us":>10}']
+		for phase, info in sorted(summary['phases'].items()):
+			lines.append(f'{phase:<16}{info["count"]:>10}{info["total_ms"]:>11.1f}{info["mean_us"]:>10.2f}{info["p50_us"]:>10.2f}{info["p99_us"]:>10.2f}')
+		lines += ['', f'{"FFI calls":<16}{"Count":>10}{"Per s":>11}']
+		for name, num in sorted(summary['calls'].items()): lines.append(f'{name:<16}{num:>10}{num / summary["elapsed_s"]:>11.0f}')
+		return '\n'.join(lines)
+
+	def dump(self, path):
+		with open(path, 'w') as f: json.dump(self.summary(), f, indent = 4)
@@ -0,0 +1,133 @@
+import gzip
+import struct
+import logging
+
+import disasm
+
+# Trace file: MAGIC, then a gzip stream of a 1-byte version, a 1-byte flags field and
+# fixed-size entries.
+MAGIC = b'U8TR'
+VERSION = 1
+FLAG_SP_EA = 1
+
+# CSR, PC, PSW (4 bytes), optionally followed by SP, EA (8 bytes)
+ENTRY = struct.Struct('<BHB')
+ENTRY_SP_EA = struct.Struct('<BHBHH')
+
+class Trace:
+	'''
+	Instruction trace recorder. Every executed instruction is packed into a preallocated
+	ring buffer of `depth` fixed-size entries, recorded before it executes. If a file is
+	being streamed to, the buffer is written out (compressed) each time it fills up.
+
+	Recording is one pack_into per instruction: 0.34-0.38 us per instruction in burst mode
+	measured with CPython 3.11 (more with SP and EA), on top of the roughly 0.6 us the
+	burst loop itself takes. Keeping the buffer, position and PSW in a closure instead of
+	attributes saved less than the run-to-run noise, so it isn't done. Compare the IPS
+	printed by --headless with and without --trace.
+	'''
+	def __init__(self, cpu, depth, sp_ea = False):
+		self.psw = cpu.psw
+		self.sp = cpu.sp
+		self.ea = cpu.ea
+		self.sp_ea = sp_ea
+		self.entry = ENTRY_SP_EA if sp_ea else ENTRY
+		self.pack = self.entry.pack_into
+		self.buf = bytearray(depth * self.entry.size)
+		self.size = len(self.buf)
+		self.pos = 0
+		self.wrapped = False
+		self.file = None
+		self.record = self.record_sp_ea if sp_ea else self.record_psw
+
+	def record_psw(self, csr, pc):
+		pos = self.pos
+		self.pack(self.buf, pos, csr, pc, self.psw.raw)
+		pos += 4
+		self.pos = pos if pos != self.size else self.wrap()
+
+	def record_sp_ea(self, csr, pc):
+		pos = self.pos
+		self.pack(self.buf, pos, csr, pc, self.psw.raw, self.sp.value, self.ea.value)
+		pos += 8
+		self.pos = pos if pos != self.size else self.wrap()
+
+	def wrap(self):
+		if self.file is not None: self.file.write(self.buf)
+		self.wrapped = True
+		return 0
+
+	def open(self, path):
+		self.close()
+		self.file = open(path, 'wb')
+		self.file.write(MAGIC)
+		self.file = gzip.GzipFile(fileobj = self.file, mode = 'wb', compresslevel = 1)
+		self.file.write(bytes((VERSION, FLAG_SP_EA if self.sp_ea else 0)))
+		# Entries recorded before the file was opened are not streamed.
+		self.pos = 0
+		self.wrapped = False
+
+	def close(self):
+		if self.file is None: return
+		self.file.write(self.buf[:self.pos])
+		fileobj = self.file.fileobj
+		self.file.close()
+		fileobj.close()
+		self.file = None
+
+	def entries(self, count = None):
+		'''
+		Returns the last `count` (default: all) entries in the buffer, oldest first, as
+		tuples of (CSR, PC, PSW) or (CSR, PC, PSW, SP, EA).
+		'''
+		data = self.buf[self.pos:] + self.buf[:self.pos] if self.wrapped else self.buf[:self.pos]
+		if count is not None: data = data[-count * self.entry.size:]
+		return list(self.entry.iter_unpack(data))
+
+	def log_tail(self, count = 16):
+		for line in format_entries(self.entries(count)): logging.warning(line)
+
+def read_trace(path):
+	'''
+	Yields the entries of a trace file, as Trace.entries does.
+	'''
+	with open(path, 'rb') as f:
+		if f.read(len(MAGIC)) != MAGIC: raise ValueError(f'{path} is not a trace file')
+		with gzip.GzipFile(fileobj = f, mode = 'rb') as data:
+			version, flags = data.read(2)
+			if version != VERSION: raise ValueError(f'unsupported trace version {version}')
+			entry = ENTRY_SP_EA if flags & FLAG_SP_EA else ENTRY
+			while True:
+				chunk = data.read(entry.size * 4096)
+				if not chunk: break
+				yield from entry.iter_unpack(chunk[:len(chunk) - len(chunk) % entry.size])
+
+def format_entries(entries, rom = None, disassembler = None):
+	'''
+	Formats trace entries one per line. If the ROM file contents are given, each entry is
+	disassembled.
+	'''
+	if disassembler is None: disassembler = disasm.Disassembler(0x1000)
+	for entry in entries:
+		csr, pc, psw = entry[:3]
+		line = f'{csr:X}:{pc:04X}H  PSW {psw:02X}'
+		if len(entry) > 3: line += f'  SP {entry[3]:04X}H  EA {entry[4]:04X}H'
+		if rom is not None:
+			addr = (csr << 16) + pc
+			code = rom[addr:addr + 6].ljust(6, b'\0')
+			line += '  ' + disassembler.instruction(csr, pc, struct.unpack('<3H', code))
+		yield line
+
+def show_trace(config, path):
+	'''
+	Entry point for main.py --show-trace.
+	'''
+	try:
+		with open(config.rom_file, 'rb') as f: rom = f.read()
+	except OSError as e:
+		logging.warning(f'could not read ROM, not disassembling: {e}')
+		rom = None
+
+	try:
+		for line in format_entries(read_trace(path), rom): print(line)
+	except BrokenPipeError: pass